@@ -13,6 +13,7 @@ import asyncio
 # Import the config file FIRST to load dotenv and configure APIs
 import config
 from services import stt, llm, tts
+from services.stt_sender import STTSender
 from schemas import TTSRequest
 
 # AssemblyAI streaming imports
@@ -217,6 +218,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
                 logging.error(f"Error sending transcription: {e}")
                 break
 
+    # AssemblyAI's send runs on a worker thread so a slow network never stalls this loop
+    stt_sender = STTSender(client.stream)
+
     # Start the transcription sender task
     sender_task = asyncio.create_task(send_transcriptions())
 
@@ -245,7 +249,7 @@ async def websocket_audio_streaming(websocket: WebSocket):
                     pcm_data = message["bytes"]
                     logging.debug(f"Received audio chunk of size: {len(pcm_data)} bytes")
                     f.write(pcm_data)  # Save to file for debugging
-                    client.stream(pcm_data)  # Send to AssemblyAI for transcription
+                    await stt_sender.send(pcm_data)  # Send to AssemblyAI for transcription
                     
                 elif message.get("text") == "EOF":
                     logging.info("Recording finished. Closing transcription session.")
@@ -259,7 +263,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
         # Cancel the sender task
         sender_task.cancel()
         
-        # Clean up AssemblyAI connection
+        # Send what is still queued, then clean up AssemblyAI connection
+        await stt_sender.close()
+        logging.info(f"STT send stats: {stt_sender.stats()}")
         try:
             client.disconnect(terminate=True)
         except Exception as e:
@@ -9,6 +9,7 @@ from uuid import uuid4
 # Import config and services
 import config
 from services import llm
+from services.stt_sender import STTSender
 
 # AssemblyAI streaming imports
 import assemblyai as aai
@@ -114,6 +115,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
             except Exception:
                 break
 
+    # AssemblyAI's send runs on a worker thread so a slow network never stalls this loop
+    stt_sender = STTSender(client.stream)
+
     sender_task = asyncio.create_task(send_transcriptions())
 
     # Connect to AssemblyAI
@@ -127,7 +131,7 @@ async def websocket_audio_streaming(websocket: WebSocket):
                 if "bytes" in msg:
                     pcm = msg["bytes"]
                     f.write(pcm)
-                    client.stream(pcm)  # AssemblyAI ko bhejo
+                    await stt_sender.send(pcm)  # AssemblyAI ko bhejo
                 elif msg.get("text") == "EOF":
                     break
 
@@ -135,6 +139,8 @@ async def websocket_audio_streaming(websocket: WebSocket):
         print("⚠️ Client disconnected")
     finally:
         sender_task.cancel()
+        await stt_sender.close()
+        print(f"STT send stats: {stt_sender.stats()}")
         client.disconnect(terminate=True)
         await websocket.close()
         print(f"🔴 Session ended, file saved at {file_path}")
\ No newline at end of file
@@ -15,6 +15,7 @@ import threading
 # Import the config file FIRST to load dotenv and configure APIs
 import config
 from services import stt, llm, tts
+from services.stt_sender import STTSender
 from schemas import TTSRequest
 
 # AssemblyAI streaming imports
@@ -275,6 +276,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
             except Exception:
                 break
 
+    # AssemblyAI's send runs on a worker thread so a slow network never stalls this loop
+    stt_sender = STTSender(client.stream)
+
     # Start the transcription sender task
     sender_task = asyncio.create_task(send_transcriptions())
 
@@ -302,7 +306,7 @@ async def websocket_audio_streaming(websocket: WebSocket):
                 if "bytes" in message:
                     pcm_data = message["bytes"]
                     f.write(pcm_data)  # Save to file for debugging
-                    client.stream(pcm_data)  # Send to AssemblyAI for transcription
+                    await stt_sender.send(pcm_data)  # Send to AssemblyAI for transcription
                     
                 elif message.get("text") == "EOF":
                     print("Recording finished")
@@ -316,7 +320,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
         # Cancel the sender task
         sender_task.cancel()
         
-        # Clean up AssemblyAI connection
+        # Send what is still queued, then clean up AssemblyAI connection
+        await stt_sender.close()
+        print(f"STT send stats: {stt_sender.stats()}")
         try:
             client.disconnect(terminate=True)
         except Exception as e:
@@ -13,6 +13,9 @@ MURF_API_KEY = os.getenv("MURF_API_KEY")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Threads shared by every session for the blocking AssemblyAI sends (each session keeps one in flight)
+STT_SEND_WORKERS = int(os.getenv("STT_SEND_WORKERS", "8"))
+
 # Configure APIs and log warnings if keys are missing
 if ASSEMBLYAI_API_KEY:
     aai.settings.api_key = ASSEMBLYAI_API_KEY
@@ -1,5 +1,5 @@
 # main.py
-from fastapi import FastAPI, Request, UploadFile, File, Path, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, UploadFile, File, Path, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -9,12 +9,20 @@ from pathlib import Path as PathLib
 from uuid import uuid4
 import json
 import asyncio
+import shutil
 import time
-import threading
 
 # Import the config file FIRST to load dotenv and configure APIs
 import config
 from services import stt, llm, tts
+from services.session_store import create_session_store
+from services.scheduler import TurnScheduler
+from services.audio_relay import AudioRelay
+from services.stt_sender import STTSender
+from services.batch_stt import BatchTranscriber
+from services.stream_upload import StreamingUpload
+from services.recording import RecordingSink
+from services.memory import ConversationMemory
 from schemas import TTSRequest
 
 # AssemblyAI streaming imports
@@ -39,13 +47,70 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# In-memory store for chat histories.
-chat_histories: Dict[str, List[Dict[str, Any]]] = {}
+# Chat histories, shared by every worker when backed by SQLite or Redis.
+chat_histories = create_session_store(
+    config.SESSION_STORE_URL,
+    ttl=config.SESSION_TTL_SECONDS,
+    max_messages=config.SESSION_MAX_MESSAGES,
+)
+
+# Conversation memory of every connected /ws session, for metrics
+ws_memories: Dict[str, ConversationMemory] = {}
+
+# Runs every LLM/Murf turn as a task on the server loop, with a global cap
+turn_scheduler = TurnScheduler(max_concurrent_turns=config.MAX_CONCURRENT_TURNS)
 
 # Base directory and uploads folder
 BASE_DIR = PathLib(__file__).resolve().parent
 UPLOADS_DIR = BASE_DIR / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
+BATCH_UPLOADS_DIR = UPLOADS_DIR / "batch"
+BATCH_UPLOADS_DIR.mkdir(exist_ok=True)
+
+# Uploaded-file transcriptions, run on a bounded worker pool instead of blocking the loop
+batch_transcriber = BatchTranscriber(
+    stt.transcribe_source,
+    workers=config.BATCH_STT_WORKERS,
+    max_queued=config.BATCH_STT_QUEUE_SIZE,
+    job_ttl=config.BATCH_STT_JOB_TTL,
+)
+
+# Optional microphone recordings of /ws sessions, written and pruned on a background thread
+recording_sink = RecordingSink(
+    PathLib(config.RECORDING_DIR) if config.RECORDING_DIR else UPLOADS_DIR / "recordings",
+    mode=config.RECORDING_MODE,
+    sample_ratio=config.RECORDING_SAMPLE_RATIO,
+    audio_format=config.RECORDING_FORMAT,
+    max_bytes=config.RECORDING_MAX_BYTES,
+    max_age=config.RECORDING_MAX_AGE_HOURS * 3600,
+    min_free_bytes=config.RECORDING_MIN_FREE_BYTES,
+    queue_chunks=config.RECORDING_QUEUE_CHUNKS,
+)
+
+
+@app.on_event("startup")
+async def bind_turn_scheduler():
+    """Attaches the turn scheduler to the server's event loop."""
+    turn_scheduler.bind(asyncio.get_running_loop())
+
+
+@app.on_event("startup")
+async def warm_murf_streams():
+    """Opens the pooled Murf stream-input connections before the first turn."""
+    if llm.murf_streams:
+        await llm.murf_streams.start()
+
+
+@app.on_event("startup")
+async def start_batch_transcriber():
+    """Starts the transcription workers on the server's event loop."""
+    batch_transcriber.start()
+
+
+@app.on_event("startup")
+def start_recording_sink():
+    """Starts the recording writer thread when recording is enabled."""
+    recording_sink.start()
 
 
 @app.get("/")
@@ -72,30 +137,144 @@ async def agent_chat(
 
     try:
         # Step 1: Transcribe audio to text
-        user_query_text = stt.transcribe_audio(audio_file)
+        try:
+            user_query_text = await batch_transcriber.transcribe(audio_file.file, audio_file.filename)
+        except asyncio.QueueFull:
+            print("Transcription queue is full. Returning fallback audio.")
+            return FileResponse(fallback_audio_path, media_type="audio/mpeg", headers={"X-Error": "true"})
         print(f"User: {user_query_text}")
+        return await respond_to_query(session_id, user_query_text)
+
+    except Exception as e:
+        print(f"Error in session {session_id}: {e}")
+        return FileResponse(fallback_audio_path, media_type="audio/mpeg", headers={"X-Error": "true"})
 
-        # Step 2: Retrieve history and get a response from the LLM
-        session_history = chat_histories.get(session_id, [])
-        llm_response_text, updated_history = llm.get_llm_response(user_query_text, session_history)
-        print(f"Assistant: {llm_response_text}")
 
-        # Step 3: Update the chat history
-        chat_histories[session_id] = updated_history
+@app.post("/agent/chat/{session_id}/stream")
+async def agent_chat_stream(
+    request: Request,
+    session_id: str = Path(..., description="The unique ID for the chat session."),
+):
+    """
+    Same turn as /agent/chat/{session_id}, but the multipart body is forwarded
+    to AssemblyAI's upload endpoint while it is still being received (and
+    optionally transcoded from WebM/Opus to 16 kHz PCM) instead of being
+    spooled to disk first.
+    """
+    fallback_audio_path = "static/fallback.mp3"
 
-        # Step 4: Convert the LLM's text response to speech
-        audio_url = tts.convert_text_to_speech(llm_response_text)
+    if not all([config.GEMINI_API_KEY, config.ASSEMBLYAI_API_KEY, config.MURF_API_KEY]):
+        print("API keys not configured. Returning fallback audio.")
+        return FileResponse(fallback_audio_path, media_type="audio/mpeg", headers={"X-Error": "true"})
 
-        if audio_url:
-            return JSONResponse(content={"audio_url": audio_url})
-        else:
-            raise Exception("TTS service did not return an audio file.")
+    try:
+        # Step 1: Upload while receiving, then transcribe the uploaded recording
+        upload = StreamingUpload(request, transcode=config.STREAM_UPLOAD_TRANSCODE)
+        upload_url = await upload.upload()
+        print(f"Streamed upload for session {session_id}: {upload.stats()}")
+        try:
+            user_query_text = await batch_transcriber.transcribe(upload_url, upload.filename)
+        except asyncio.QueueFull:
+            print("Transcription queue is full. Returning fallback audio.")
+            return FileResponse(fallback_audio_path, media_type="audio/mpeg", headers={"X-Error": "true"})
+        print(f"User: {user_query_text}")
+        return await respond_to_query(session_id, user_query_text)
 
     except Exception as e:
         print(f"Error in session {session_id}: {e}")
         return FileResponse(fallback_audio_path, media_type="audio/mpeg", headers={"X-Error": "true"})
 
 
+async def respond_to_query(session_id: str, user_query_text: str) -> JSONResponse:
+    """Add to History -> LLM -> Add to History -> TTS, for an already transcribed turn."""
+    # Step 2: Retrieve history and get a response from the LLM
+    session_history = await asyncio.to_thread(chat_histories.get, session_id)
+    llm_response_text, updated_history = await asyncio.to_thread(llm.get_llm_response, user_query_text, session_history)
+    print(f"Assistant: {llm_response_text}")
+
+    # Step 3: Update the chat history
+    await asyncio.to_thread(chat_histories.set, session_id, updated_history)
+
+    # Step 4: Convert the LLM's text response to speech
+    audio_url = await asyncio.to_thread(tts.convert_text_to_speech, llm_response_text)
+
+    if audio_url:
+        return JSONResponse(content={"audio_url": audio_url})
+    else:
+        raise Exception("TTS service did not return an audio file.")
+
+
+def save_upload(upload: UploadFile, file_path: PathLib):
+    """Copies an uploaded file to disk; blocking, so run it off the event loop."""
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, 1024 * 1024)
+
+
+@app.post("/transcriptions", status_code=202)
+async def submit_transcriptions(files: List[UploadFile] = File(...)):
+    """Queues one transcription job per uploaded file; poll /transcriptions/{job_id} for results."""
+    jobs = []
+    for upload in files:
+        file_path = BATCH_UPLOADS_DIR / f"{uuid4().hex}_{PathLib(upload.filename or 'audio').name}"
+        await asyncio.to_thread(save_upload, upload, file_path)
+        try:
+            job = batch_transcriber.submit(str(file_path), upload.filename, delete_after=True)
+        except asyncio.QueueFull:
+            file_path.unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=429,
+                detail={"error": "Transcription queue is full", "accepted": [j.to_dict() for j in jobs]},
+            )
+        jobs.append(job)
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+
+@app.get("/transcriptions/{job_id}")
+async def get_transcription(job_id: str):
+    """Returns a transcription job's status, and its text once completed."""
+    job = batch_transcriber.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown transcription job")
+    return job.to_dict()
+
+
+@app.on_event("shutdown")
+def close_session_store():
+    """Flushes pending session writes."""
+    chat_histories.close()
+
+
+@app.on_event("shutdown")
+async def close_murf_streams():
+    """Closes the pooled Murf stream-input connections."""
+    if llm.murf_streams:
+        await llm.murf_streams.close()
+
+
+@app.on_event("shutdown")
+def close_batch_transcriber():
+    """Stops the transcription workers."""
+    batch_transcriber.close()
+
+
+@app.on_event("shutdown")
+def close_recording_sink():
+    """Finishes open recordings and stops the writer thread."""
+    recording_sink.close()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Turn scheduler, Murf stream pool, conversation memory, batch transcription and recording counters."""
+    return {
+        "turns": turn_scheduler.stats(),
+        "conversations": {session_id: memory.stats() for session_id, memory in ws_memories.items()},
+        "murf_streams": llm.murf_streams.stats() if llm.murf_streams else None,
+        "transcriptions": batch_transcriber.stats(),
+        "recordings": recording_sink.stats(),
+    }
+
+
 @app.post("/tts")
 async def tts_endpoint(request: TTSRequest):
     """Endpoint for the simple Text-to-Speech utility."""
@@ -124,7 +303,6 @@ async def websocket_audio_streaming(websocket: WebSocket):
     """Receive PCM audio chunks from client and transcribe in real-time using AssemblyAI with turn detection."""
     await websocket.accept()
     file_id = uuid4().hex
-    file_path = UPLOADS_DIR / f"streamed_{file_id}.pcm"
 
     # Check if AssemblyAI API key is configured
     if not config.ASSEMBLYAI_API_KEY:
@@ -153,11 +331,17 @@ async def websocket_audio_streaming(websocket: WebSocket):
         await websocket.close(code=1000, reason="Murf API key not configured")
         return
 
-    # Create a queue for transcription messages
+    # Create a queue for transcription messages (filled from AssemblyAI's thread via the loop)
+    loop = asyncio.get_running_loop()
     transcription_queue = asyncio.Queue()
     
-    # Session history for WebSocket connection
-    session_history = []
+    # Token-budgeted history for this WebSocket connection; older turns are folded into a summary
+    memory = ConversationMemory(
+        token_budget=config.MEMORY_TOKEN_BUDGET,
+        keep_recent_turns=config.MEMORY_KEEP_RECENT_TURNS,
+        summarize=llm.summarize_conversation,
+    )
+    ws_memories[file_id] = memory
     
     # Track processed turns to prevent duplicates (normalize case and whitespace)
     processed_turns = set()
@@ -173,45 +357,25 @@ async def websocket_audio_streaming(websocket: WebSocket):
 
     # Define async function to process LLM with Murf integration and stream audio to client
     async def process_llm_with_murf_and_stream_audio(transcript_text: str):
-        """Process LLM streaming response with Murf integration and stream audio to client"""
-        nonlocal session_history
+        """Process LLM streaming response with Murf integration and relay audio to client as it arrives"""
+
+        async def send_to_client(message: Dict[str, Any]):
+            await websocket.send_text(json.dumps(message))
+
+        relay = AudioRelay(send_to_client, maxsize=config.AUDIO_RELAY_QUEUE_SIZE)
+        relay.start()
         try:
-            llm_response_text, updated_history, audio_chunks = await llm.get_llm_streaming_response_with_murf(transcript_text, session_history)
-            session_history = updated_history
+            llm_response_text, updated_history, chunk_count = await llm.get_llm_streaming_response_with_murf(
+                transcript_text, memory.history(), relay.put
+            )
+            memory.add_turn(updated_history[-2], updated_history[-1])
+            # Flush whatever is still queued for a slow client, then mark the turn complete
+            await relay.close()
             print()  # New line after streaming response
-            print(f"\nReceived {len(audio_chunks)} audio chunks from Murf")
-            
-            # Stream audio chunks to client
-            if audio_chunks:
-                print(f"Streaming {len(audio_chunks)} audio chunks to client...")
-                for i, chunk in enumerate(audio_chunks):
-                    try:
-                        await websocket.send_text(json.dumps({
-                            "type": "audio_chunk",
-                            "chunk_index": i + 1,
-                            "total_chunks": len(audio_chunks),
-                            "audio_data": chunk,
-                            "is_final": i == len(audio_chunks) - 1
-                        }))
-                        print(f"Sent audio chunk {i + 1}/{len(audio_chunks)} to client")
-                    except Exception as chunk_error:
-                        print(f"Error sending audio chunk {i + 1}: {chunk_error}")
-                        break
-                
-                # Send completion message
-                try:
-                    await websocket.send_text(json.dumps({
-                        "type": "audio_complete",
-                        "message": "Audio streaming completed",
-                        "total_chunks": len(audio_chunks)
-                    }))
-                    print("Audio streaming completed")
-                except Exception as complete_error:
-                    print(f"Error sending completion message: {complete_error}")
-            else:
-                print("No audio chunks received from Murf")
-                
+            print(f"\nRelayed {chunk_count} audio chunks from Murf: {relay.stats()}")
+
         except Exception as e:
+            relay.cancel()
             print(f"\nError in LLM/Murf integration: {e}")
             try:
                 await websocket.send_text(json.dumps({
@@ -220,22 +384,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
                 }))
             except:
                 pass
-
-    def process_llm_with_murf_sync(transcript_text: str):
-        """Synchronous wrapper that runs async function in new event loop"""
-        def run_in_thread():
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            try:
-                new_loop.run_until_complete(process_llm_with_murf_and_stream_audio(transcript_text))
-            except Exception as e:
-                print(f"\nError in thread: {e}")
-            finally:
-                new_loop.close()
-        
-        thread = threading.Thread(target=run_in_thread)
-        thread.daemon = True
-        thread.start()
+        except asyncio.CancelledError:
+            relay.cancel()
+            raise
 
     # Define event handlers
     def on_begin(self: Type[StreamingClient], event: BeginEvent):
@@ -262,7 +413,7 @@ async def websocket_audio_streaming(websocket: WebSocket):
             
             # Put final transcription in queue for async sending
             try:
-                transcription_queue.put_nowait({
+                loop.call_soon_threadsafe(transcription_queue.put_nowait, {
                     "type": "transcription",
                     "text": transcript_text,
                     "is_final": True,
@@ -270,14 +421,16 @@ async def websocket_audio_streaming(websocket: WebSocket):
                 })
                 
                 # Send explicit end-of-turn notification
-                transcription_queue.put_nowait({
+                loop.call_soon_threadsafe(transcription_queue.put_nowait, {
                     "type": "turn_end",
                     "message": "User stopped talking"
                 })
                 
                 # Process LLM streaming response with Murf integration and stream audio
                 print("Assistant: ", end="", flush=True)
-                process_llm_with_murf_sync(transcript_text)
+                turn_scheduler.submit_threadsafe(
+                    file_id, lambda: process_llm_with_murf_and_stream_audio(transcript_text)
+                )
                 
             except asyncio.QueueFull:
                 print("Transcription queue is full")
@@ -288,7 +441,7 @@ async def websocket_audio_streaming(websocket: WebSocket):
     def on_error(self: Type[StreamingClient], error: StreamingError):
         print(f"Transcription error: {error}")
         try:
-            transcription_queue.put_nowait({
+            loop.call_soon_threadsafe(transcription_queue.put_nowait, {
                 "type": "error",
                 "message": f"Transcription error: {error}"
             })
@@ -313,9 +466,18 @@ async def websocket_audio_streaming(websocket: WebSocket):
             except Exception:
                 break
 
+    # AssemblyAI's send runs on a worker thread so a slow network never stalls this loop
+    stt_sender = STTSender(
+        client.stream, max_queued=config.STT_SEND_QUEUE_CHUNKS, policy=config.STT_OVERFLOW_POLICY
+    )
+
     # Start the transcription sender task
     sender_task = asyncio.create_task(send_transcriptions())
 
+    # None unless this session is being recorded; opened only once nothing can return
+    # before the finally below closes it
+    recorder = recording_sink.open(file_id)
+
     # Connect to AssemblyAI streaming service
     try:
         client.connect(
@@ -332,29 +494,35 @@ async def websocket_audio_streaming(websocket: WebSocket):
             "message": "Connected to transcription service with turn detection and audio streaming"
         }))
 
-        # Save audio to file for debugging (optional)
-        with open(file_path, "wb") as f:
-            while True:
-                message = await websocket.receive()
+        while True:
+            message = await websocket.receive()
+            
+            if "bytes" in message:
+                pcm_data = message["bytes"]
+                if recorder:
+                    recorder.write(pcm_data)  # Queued for the recording thread, never blocks
+                await stt_sender.send(pcm_data)  # Send to AssemblyAI for transcription
                 
-                if "bytes" in message:
-                    pcm_data = message["bytes"]
-                    f.write(pcm_data)  # Save to file for debugging
-                    client.stream(pcm_data)  # Send to AssemblyAI for transcription
-                    
-                elif message.get("text") == "EOF":
-                    print("Recording finished")
-                    break
+            elif message.get("text") == "EOF":
+                print("Recording finished")
+                break
 
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
     finally:
-        # Cancel the sender task
+        # Cancel the sender task and any turn still running for this socket
         sender_task.cancel()
+        turn_scheduler.cancel_session(file_id)
+        memory.close()
+        ws_memories.pop(file_id, None)
+        if recorder:
+            recorder.close()
         
-        # Clean up AssemblyAI connection
+        # Send what is still queued, then clean up AssemblyAI connection
+        await stt_sender.close()
+        print(f"STT send stats: {stt_sender.stats()}")
         try:
             client.disconnect(terminate=True)
         except Exception as e:
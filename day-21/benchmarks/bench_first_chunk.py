@@ -0,0 +1,98 @@
+# benchmarks/bench_first_chunk.py
+"""
+First audio chunk at the browser: collect-until-final vs. the streaming relay.
+
+A local fake Murf stream-input server answers each sentence with a few
+audio frames after a synthesis delay, so the numbers isolate how soon the
+server starts forwarding. Run from day-21:
+
+    python -m benchmarks.bench_first_chunk
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import websockets
+
+from services import llm
+from services.audio_relay import AudioRelay
+from services.murf_stream import MurfStreamManager
+
+SENTENCES = [
+    "Sure, here is a quick plan.",
+    "First, warm up for five minutes.",
+    "Then do three rounds of squats and push-ups.",
+    "Finish with some light stretching.",
+]
+
+
+def fake_murf(synthesis_delay: float, frames_per_sentence: int):
+    async def handler(ws):
+        async for message in ws:
+            data = json.loads(message)
+            if "text" not in data:
+                continue
+            if data["text"]:
+                await asyncio.sleep(synthesis_delay)
+                for _ in range(frames_per_sentence):
+                    await ws.send(json.dumps({"context_id": data["context_id"], "audio": "A" * 8192}))
+                    await asyncio.sleep(synthesis_delay / frames_per_sentence)
+            if data.get("end"):
+                await ws.send(json.dumps({"context_id": data["context_id"], "final": True}))
+    return handler
+
+
+async def run_turn(manager: MurfStreamManager, streaming: bool, client_delay: float) -> float:
+    start = time.perf_counter()
+    first_chunk = None
+
+    async def send_to_client(message):
+        nonlocal first_chunk
+        await asyncio.sleep(client_delay)
+        if message["type"] == "audio_chunk" and first_chunk is None:
+            first_chunk = time.perf_counter() - start
+
+    async with manager.turn({}) as turn:
+        for i, sentence in enumerate(SENTENCES):
+            await turn.send_text(sentence, end=i == len(SENTENCES) - 1)
+
+        if streaming:
+            relay = AudioRelay(send_to_client)
+            relay.start()
+            await llm.relay_audio(turn, relay.put)
+            await relay.close()
+        else:
+            # Previous behaviour: gather every chunk, then send them all
+            chunks = [chunk async for chunk in llm.receive_loop(turn)]
+            for index, chunk in enumerate(chunks):
+                await send_to_client({"type": "audio_chunk", "chunk_index": index + 1, "audio_data": chunk})
+    return first_chunk
+
+
+async def bench(args):
+    async with websockets.serve(fake_murf(args.synthesis_delay, args.frames), "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        manager = MurfStreamManager("bench", pool_size=1)
+        manager.url = f"ws://127.0.0.1:{port}/"
+        await manager.start()
+        try:
+            for name, streaming in (("collect", False), ("relay", True)):
+                samples = [await run_turn(manager, streaming, args.client_delay) for _ in range(args.runs)]
+                print(f"{name:>8}: first chunk at browser {1000 * sum(samples) / len(samples):7.1f} ms")
+        finally:
+            await manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--synthesis-delay", type=float, default=0.15, help="seconds Murf spends per sentence")
+    parser.add_argument("--frames", type=int, default=4, help="audio frames per sentence")
+    parser.add_argument("--client-delay", type=float, default=0.002, help="seconds per send to the browser")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,59 @@ MURF_API_KEY = os.getenv("MURF_API_KEY")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Chat history storage: memory://, sqlite:///path/to/sessions.db or redis://host:port/db
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "memory://")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "40"))
+
+# /ws conversation history: older turns are summarized once the history exceeds the token budget
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+MEMORY_KEEP_RECENT_TURNS = int(os.getenv("MEMORY_KEEP_RECENT_TURNS", "4"))
+
+# Conversation turns (LLM + Murf) running at once across all WebSocket sessions
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "16"))
+
+# Warm Murf stream-input connections shared by all turns, and turns multiplexed on each
+MURF_STREAM_POOL_SIZE = int(os.getenv("MURF_STREAM_POOL_SIZE", "2"))
+MURF_STREAM_TURNS_PER_CONNECTION = int(os.getenv("MURF_STREAM_TURNS_PER_CONNECTION", "4"))
+MURF_STREAM_HEALTH_INTERVAL = float(os.getenv("MURF_STREAM_HEALTH_INTERVAL", "15"))
+# Seconds a turn waits for a free healthy connection before it fails
+MURF_STREAM_ACQUIRE_TIMEOUT = float(os.getenv("MURF_STREAM_ACQUIRE_TIMEOUT", "10"))
+# Murf frames buffered per turn; a turn whose consumer falls this far behind is failed
+MURF_STREAM_TURN_QUEUE_SIZE = int(os.getenv("MURF_STREAM_TURN_QUEUE_SIZE", "64"))
+
+# Murf audio chunks buffered per turn while the browser socket catches up
+AUDIO_RELAY_QUEUE_SIZE = int(os.getenv("AUDIO_RELAY_QUEUE_SIZE", "32"))
+
+# Audio chunks waiting for the AssemblyAI send worker, and what to do when that queue is full:
+# "drop_oldest" keeps latency bounded, "backpressure" stops reading from the client until there is room
+STT_SEND_QUEUE_CHUNKS = int(os.getenv("STT_SEND_QUEUE_CHUNKS", "50"))
+STT_OVERFLOW_POLICY = os.getenv("STT_OVERFLOW_POLICY", "drop_oldest")
+# Threads shared by every session for the blocking AssemblyAI sends (each session keeps one in flight)
+STT_SEND_WORKERS = int(os.getenv("STT_SEND_WORKERS", "8"))
+
+# Uploaded-file transcriptions running at once, jobs allowed to wait, and how long finished jobs stay queryable
+BATCH_STT_WORKERS = int(os.getenv("BATCH_STT_WORKERS", "4"))
+BATCH_STT_QUEUE_SIZE = int(os.getenv("BATCH_STT_QUEUE_SIZE", "100"))
+BATCH_STT_JOB_TTL = float(os.getenv("BATCH_STT_JOB_TTL", "3600"))
+
+# Transcode WebM/Opus uploads to 16 kHz mono PCM with ffmpeg on /agent/chat/{session_id}/stream
+STREAM_UPLOAD_TRANSCODE = os.getenv("STREAM_UPLOAD_TRANSCODE", "false").lower() == "true"
+
+# Microphone recordings of /ws sessions: "off", "sampled" (RECORDING_SAMPLE_RATIO of sessions) or "full",
+# stored as flac, opus or pcm under RECORDING_DIR (default uploads/recordings)
+RECORDING_MODE = os.getenv("RECORDING_MODE", "off")
+RECORDING_SAMPLE_RATIO = float(os.getenv("RECORDING_SAMPLE_RATIO", "0.1"))
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "flac")
+RECORDING_DIR = os.getenv("RECORDING_DIR")
+# Retention: recordings older than RECORDING_MAX_AGE_HOURS go first, then the oldest until under RECORDING_MAX_BYTES;
+# no new recording starts while the disk has less than RECORDING_MIN_FREE_BYTES free
+RECORDING_MAX_BYTES = int(os.getenv("RECORDING_MAX_BYTES", str(500 * 1024 * 1024)))
+RECORDING_MAX_AGE_HOURS = float(os.getenv("RECORDING_MAX_AGE_HOURS", "168"))
+RECORDING_MIN_FREE_BYTES = int(os.getenv("RECORDING_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+# Audio chunks waiting for the writer thread before new ones are dropped
+RECORDING_QUEUE_CHUNKS = int(os.getenv("RECORDING_QUEUE_CHUNKS", "1024"))
+
 # Configure APIs and log warnings if keys are missing
 if ASSEMBLYAI_API_KEY:
     aai.settings.api_key = ASSEMBLYAI_API_KEY
@@ -0,0 +1,78 @@
+# services/audio_relay.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class AudioRelay:
+    """
+    Forwards one turn's Murf audio chunks to the browser as they arrive.
+
+    Chunks go through a bounded queue drained by a sender task. When the
+    client socket is slow the queue fills and `put` waits, so the Murf
+    receiver stops pulling from its context queue instead of buffering
+    the whole reply in the relay.
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[None]], maxsize: int = 32):
+        self._send = send
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._sender: Optional[asyncio.Task] = None
+        self.started_at = time.perf_counter()
+        self.first_chunk_latency: Optional[float] = None
+        self.chunks_sent = 0
+        self.backpressure_waits = 0
+        self.max_depth = 0
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._sender = asyncio.create_task(self._run())
+
+    async def put(self, chunk: str):
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put(chunk)
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def _run(self):
+        while True:
+            chunk = await self._queue.get()
+            if chunk is _END:
+                return
+            self.chunks_sent += 1
+            if self.first_chunk_latency is None:
+                self.first_chunk_latency = time.perf_counter() - self.started_at
+            await self._send({
+                "type": "audio_chunk",
+                "chunk_index": self.chunks_sent,
+                "audio_data": chunk,
+            })
+
+    async def close(self):
+        """Waits until every queued chunk has been sent, then reports completion."""
+        if self._sender is None:
+            return
+        await self._queue.put(_END)
+        await self._sender
+        await self._send({
+            "type": "audio_complete",
+            "message": "Audio streaming completed",
+            "total_chunks": self.chunks_sent,
+        })
+
+    def cancel(self):
+        if self._sender is not None:
+            self._sender.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks_sent": self.chunks_sent,
+            "first_chunk_latency_ms": round(self.first_chunk_latency * 1000, 1) if self.first_chunk_latency else None,
+            "backpressure_waits": self.backpressure_waits,
+            "max_queue_depth": self.max_depth,
+        }
@@ -0,0 +1,138 @@
+# services/batch_stt.py
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Optional, Union
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# A recording on disk, or an open file object
+AudioSource = Union[str, BinaryIO]
+
+
+@dataclass
+class TranscriptionJob:
+    id: str
+    filename: str
+    source: Any = field(repr=False)
+    delete_after: bool = False
+    status: str = "queued"        # queued -> running -> completed | failed
+    text: Optional[str] = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "text": self.text,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BatchTranscriber:
+    """
+    Runs blocking AssemblyAI file transcriptions (upload + poll) on a bounded
+    worker pool, off the event loop.
+
+    Jobs wait in a submission queue of `max_queued` entries. `submit` raises
+    asyncio.QueueFull when it is full, so callers can push back (HTTP 429)
+    instead of piling up work. `workers` jobs run at once, each on its own
+    thread. Finished jobs stay queryable for `job_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[AudioSource], str],
+        workers: int = 4,
+        max_queued: int = 100,
+        job_ttl: float = 3600.0,
+    ):
+        self._transcribe = transcribe
+        self.workers = workers
+        self.job_ttl = job_ttl
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-stt")
+        self._tasks = []
+        self.jobs: Dict[str, TranscriptionJob] = {}
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def start(self):
+        """Starts the worker tasks. Call on the server loop."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, source: AudioSource, filename: str = "", delete_after: bool = False) -> TranscriptionJob:
+        """Queues a recording; `delete_after` removes a source file once it has been transcribed."""
+        self._prune()
+        job = TranscriptionJob(id=uuid4().hex, filename=filename, source=source, delete_after=delete_after)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise
+        self.jobs[job.id] = job
+        self.counters["submitted"] += 1
+        return job
+
+    async def transcribe(self, source: AudioSource, filename: str = "") -> str:
+        """Submits a recording and waits for its transcript."""
+        job = self.submit(source, filename)
+        await job.done.wait()
+        if job.status == "failed":
+            raise Exception(f"Transcription failed: {job.error}")
+        return job.text
+
+    def get(self, job_id: str) -> Optional[TranscriptionJob]:
+        return self.jobs.get(job_id)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.text = await loop.run_in_executor(self._executor, self._transcribe, job.source)
+                job.status = "completed"
+                self.counters["completed"] += 1
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                self.counters["failed"] += 1
+                logger.error(f"Transcription job {job.id} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+                if job.delete_after and isinstance(job.source, str):
+                    try:
+                        os.remove(job.source)
+                    except OSError as e:
+                        logger.warning(f"Could not remove {job.source}: {e}")
+                job.source = None
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for job in self.jobs.values() if job.status == "running")
+        return {**self.counters, "queued": self._queue.qsize(), "running": running, "workers": self.workers}
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
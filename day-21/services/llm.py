@@ -2,12 +2,15 @@
 
 import google.generativeai as genai
 import websockets
-import json
 import asyncio
 import re
 import logging
 import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, AsyncIterator, Awaitable, Callable
+
+import config
+from services.murf_stream import MurfStreamManager, MurfTurn
+from services.memory import content_role, content_text
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,6 +26,21 @@ else:
 if not MURF_API_KEY:
     print("Warning: MURF_API_KEY not found in .env file.")
 
+# Pool of warm Murf stream-input connections; every turn gets its own context id on it
+murf_streams = MurfStreamManager(
+    MURF_API_KEY,
+    pool_size=config.MURF_STREAM_POOL_SIZE,
+    max_turns_per_connection=config.MURF_STREAM_TURNS_PER_CONNECTION,
+    health_interval=config.MURF_STREAM_HEALTH_INTERVAL,
+    acquire_timeout=config.MURF_STREAM_ACQUIRE_TIMEOUT,
+    turn_queue_size=config.MURF_STREAM_TURN_QUEUE_SIZE,
+) if MURF_API_KEY else None
+
+MURF_VOICE_CONFIG = {
+    "voiceId": "en-US-darnell",
+    "style": "Conversational"
+}
+
 def get_llm_response(user_query: str, history: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
     """Gets a response from the Gemini LLM and updates chat history."""
     model = genai.GenerativeModel('gemini-1.5-flash')
@@ -30,34 +48,42 @@ def get_llm_response(user_query: str, history: List[Dict[str, Any]]) -> Tuple[st
     response = chat.send_message(user_query)
     return response.text, chat.history
 
-async def receive_loop(ws):
-    """Receive audio chunks from Murf WebSocket"""
-    audio_chunks = []
+async def receive_loop(turn: MurfTurn) -> AsyncIterator[str]:
+    """Yields base64 audio chunks from this turn's Murf context as they arrive"""
     chunk_count = 1
+    while True:
+        data = await turn.queue.get()
+
+        if data.get("error"):
+            logger.error(f"Murf error for context {turn.context_id}: {data['error']}")
+            return
+
+        if "audio" in data and data["audio"]:
+            base64_chunk = data["audio"]
+            max_len = 64
+            if len(base64_chunk) > max_len:
+                truncated_chunk = f"{base64_chunk[:30]}...{base64_chunk[-30:]}"
+            else:
+                truncated_chunk = base64_chunk
+            print(f"[murf ai][chunk {chunk_count}] {truncated_chunk}")
+            chunk_count += 1
+            yield base64_chunk
+
+        if data.get("final"):
+            logger.info("Murf confirms final audio chunk received.")
+            turn.finished = True
+            return
+
+async def relay_audio(turn: MurfTurn, on_audio_chunk: Callable[[str], Awaitable[None]]) -> int:
+    """Hands every chunk to `on_audio_chunk` as soon as it lands; returns the chunk count."""
+    count = 0
     try:
-        while True:
-            response = await ws.recv()
-            data = json.loads(response)
-            
-            if "audio" in data and data["audio"]:
-                base64_chunk = data["audio"]
-                max_len = 64
-                if len(base64_chunk) > max_len:
-                    truncated_chunk = f"{base64_chunk[:30]}...{base64_chunk[-30:]}"
-                else:
-                    truncated_chunk = base64_chunk
-                print(f"[murf ai][chunk {chunk_count}] {truncated_chunk}")
-                audio_chunks.append(base64_chunk)
-                chunk_count += 1
-            
-            if data.get("final"):
-                logger.info("Murf confirms final audio chunk received.")
-                break
-    except websockets.exceptions.ConnectionClosed:
-        pass
+        async for chunk in receive_loop(turn):
+            await on_audio_chunk(chunk)
+            count += 1
     except Exception as e:
         logger.error(f"Error in receive loop: {str(e)}")
-    return audio_chunks
+    return count
 
 def get_llm_streaming_response(user_query: str, history: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
     """Gets a streaming response from the Gemini LLM, accumulates it, and returns final response with history."""
@@ -78,90 +104,72 @@ def get_llm_streaming_response(user_query: str, history: List[Dict[str, Any]]) -
     
     return accumulated_response, chat.history
 
-async def get_llm_streaming_response_with_murf(user_query: str, history: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]], List[str]]:
+async def get_llm_streaming_response_with_murf(
+    user_query: str,
+    history: List[Dict[str, Any]],
+    on_audio_chunk: Callable[[str], Awaitable[None]],
+) -> Tuple[str, List[Dict[str, Any]], int]:
     """
     Gets a streaming response from Gemini LLM, sends sentences to Murf via WebSocket,
-    and returns the text response, updated history, and audio chunks.
+    passes each audio chunk to `on_audio_chunk` while the reply is still being generated,
+    and returns the text response, updated history, and number of audio chunks.
     """
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API key is missing.")
     if not MURF_API_KEY:
         raise ValueError("Murf API key is missing.")
     
-    context_id = "day20-static-context"  # Static context_id for Murf to avoid context limit errors
-    
+    if murf_streams is None:
+        raise ValueError("Murf stream pool is not configured.")
+
     try:
-        # Connect to Murf WebSocket
-        uri = (
-            f"wss://api.murf.ai/v1/speech/stream-input"
-            f"?api-key={MURF_API_KEY}"
-            f"&sample_rate=44100"
-            f"&channel_type=MONO"
-            f"&format=WAV"
-        )
-        
-        async with websockets.connect(uri) as ws:
-            # Send voice configuration
-            voice_config = {
-                "context_id": context_id,
-                "voice_config": {
-                    "voiceId": "en-US-darnell",
-                    "style": "Conversational"
-                }
-            }
-            await ws.send(json.dumps(voice_config))
-            
+        # Borrow a warm connection and open a fresh context for this turn
+        async with murf_streams.turn(MURF_VOICE_CONFIG) as turn:
             # Start the audio receiver task
-            receiver_task = asyncio.create_task(receive_loop(ws))
-            
-            # Generate streaming response from Gemini
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            chat = model.start_chat(history=history)
-            stream = chat.send_message(user_query, stream=True)
-            
-            sentence_buffer = ""
-            accumulated_response = ""
+            receiver_task = asyncio.create_task(relay_audio(turn, on_audio_chunk))
             
-            print("\nGEMINI STREAMING RESPONSE \n")
-            for chunk in stream:
-                if chunk.text:
-                    accumulated_response += chunk.text
-                    sentence_buffer += chunk.text
-                    print(chunk.text, end="", flush=True)
-
-                    # Split into sentences using regex
-                    sentences = re.split(r'(?<=[.?!])\s+', sentence_buffer)
-
-                    if len(sentences) > 1:
-                        # Send complete sentences to Murf
-                        for sentence in sentences[:-1]:
-                            if sentence.strip():
-                                text_msg = {
-                                    "context_id": context_id,
-                                    "text": sentence.strip(),
-                                    "end": False
-                                }
-                                await ws.send(json.dumps(text_msg))
-                        sentence_buffer = sentences[-1]
-
-            # Send final sentence buffer if any
-            if sentence_buffer.strip():
-                text_msg = {
-                    "context_id": context_id,
-                    "text": sentence_buffer.strip(),
-                    "end": True
-                }
-                await ws.send(json.dumps(text_msg))
-
-            print("\nEND OF GEMINI STREAM\n")
-
-            # Wait for all audio chunks from Murf
-            audio_chunks = await receiver_task
-
-            if not accumulated_response:
-                raise ValueError("No response from Gemini LLM stream.")
-
-            return accumulated_response, chat.history, audio_chunks
+            try:
+                # Generate streaming response from Gemini
+                # Async streaming so the turn never blocks the server loop it runs on
+                model = genai.GenerativeModel('gemini-1.5-flash')
+                chat = model.start_chat(history=history)
+                stream = await chat.send_message_async(user_query, stream=True)
+
+                sentence_buffer = ""
+                accumulated_response = ""
+
+                print("\nGEMINI STREAMING RESPONSE \n")
+                async for chunk in stream:
+                    if chunk.text:
+                        accumulated_response += chunk.text
+                        sentence_buffer += chunk.text
+                        print(chunk.text, end="", flush=True)
+
+                        # Split into sentences using regex
+                        sentences = re.split(r'(?<=[.?!])\s+', sentence_buffer)
+
+                        if len(sentences) > 1:
+                            # Send complete sentences to Murf
+                            for sentence in sentences[:-1]:
+                                if sentence.strip():
+                                    await turn.send_text(sentence.strip(), end=False)
+                            sentence_buffer = sentences[-1]
+
+                # Send final sentence buffer; even an empty one closes the context on Murf's side
+                await turn.send_text(sentence_buffer.strip(), end=True)
+
+                print("\nEND OF GEMINI STREAM\n")
+
+                # Wait for the last audio chunk from Murf
+                audio_chunk_count = await receiver_task
+
+                if not accumulated_response:
+                    raise ValueError("No response from Gemini LLM stream.")
+
+                return accumulated_response, chat.history, audio_chunk_count
+            finally:
+                # Stop relaying if the Gemini side failed before Murf finished
+                receiver_task.cancel()
 
     except genai.types.generation_types.BlockedPromptException as e:
         logger.error(f"Gemini blocked prompt: {str(e)}")
@@ -174,4 +182,16 @@ async def get_llm_streaming_response_with_murf(user_query: str, history: List[Di
         raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def summarize_conversation(previous_summary: str, turns: List[Any]) -> str:
+    """Folds `turns` into `previous_summary`, for the /ws session's ConversationMemory."""
+    transcript = "\n".join(f"{content_role(content)}: {content_text(content)}" for content in turns)
+    prompt = (
+        "Update the running summary of this conversation. Keep names, facts, user preferences "
+        "and open questions; drop small talk. Reply with the summary only, in under 800 characters.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\nNew exchanges:\n{transcript}"
+    )
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    response = await model.generate_content_async(prompt)
+    return response.text
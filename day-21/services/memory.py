@@ -0,0 +1,144 @@
+# services/memory.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Summarizer signature: (previous_summary, turns_to_fold) -> new summary
+Summarizer = Callable[[str, List[Any]], Awaitable[str]]
+
+
+def content_text(content: Any) -> str:
+    """Returns the text of a history entry, whether a dict or a Gemini Content proto."""
+    parts = content.get("parts", []) if isinstance(content, dict) else content.parts
+    texts = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict):
+            texts.append(part.get("text", ""))
+        else:
+            texts.append(getattr(part, "text", ""))
+    return " ".join(texts)
+
+
+def content_role(content: Any) -> str:
+    return content.get("role", "") if isinstance(content, dict) else content.role
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting and avoids a count request per turn
+    return max(1, len(text) // 4)
+
+
+class ConversationMemory:
+    """
+    Token-budgeted conversation history for one session.
+
+    Recent turns are kept verbatim. When they exceed `token_budget`, the oldest
+    turns (beyond `keep_recent_turns`) are folded into a running summary by
+    `summarize` in the background. Until that summary lands they are still sent,
+    so nothing is silently lost; afterwards only the summary is.
+
+    A failed summary keeps the turns verbatim and is retried by a later
+    `add_turn`, no sooner than `retry_backoff` seconds after the failure,
+    doubling with each consecutive failure up to `max_retry_backoff`.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        keep_recent_turns: int = 4,
+        summarize: Optional[Summarizer] = None,
+        retry_backoff: float = 5.0,
+        max_retry_backoff: float = 300.0,
+    ):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summarize = summarize
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.summary = ""
+        self._turns: List[List[Any]] = []     # each turn is [user content, model content]
+        self._folding: List[List[Any]] = []   # turns being summarized right now
+        self._summary_task: Optional[asyncio.Task] = None
+        self.total_turns = 0
+        self.folded_turns = 0
+        self.summaries = 0
+        self.failed_summaries = 0
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+
+    def _tokens(self, turns: List[List[Any]]) -> int:
+        return sum(estimate_tokens(content_text(content)) for turn in turns for content in turn)
+
+    def history(self) -> List[Any]:
+        """Returns the history to send with the next request."""
+        history: List[Any] = []
+        if self.summary:
+            history.append({"role": "user", "parts": [f"Summary of our conversation so far: {self.summary}"]})
+            history.append({"role": "model", "parts": ["Understood, I'll keep that in mind."]})
+        for turn in self._folding + self._turns:
+            history.extend(turn)
+        return history
+
+    def add_turn(self, user_content: Any, model_content: Any):
+        """Records one exchange and schedules folding if the budget is exceeded."""
+        self._turns.append([user_content, model_content])
+        self.total_turns += 1
+        self._maybe_fold()
+
+    def _maybe_fold(self):
+        if self._summary_task is not None or self.summarize is None:
+            return
+        if time.monotonic() < self._retry_at:
+            return
+        if estimate_tokens(self.summary) + self._tokens(self._turns) <= self.token_budget:
+            return
+        overflow = len(self._turns) - self.keep_recent_turns
+        if overflow <= 0:
+            return
+        self._folding, self._turns = self._turns[:overflow], self._turns[overflow:]
+        self._summary_task = asyncio.get_running_loop().create_task(self._fold())
+
+    async def _fold(self):
+        try:
+            flat = [content for turn in self._folding for content in turn]
+            self.summary = (await self.summarize(self.summary, flat)).strip()
+            self.folded_turns += len(self._folding)
+            self.summaries += 1
+            logger.info(f"Folded {len(self._folding)} turns into summary ({estimate_tokens(self.summary)} tokens)")
+            self._folding = []
+            self._consecutive_failures = 0
+        except Exception as e:
+            # Keep the turns verbatim; a later add_turn retries once the backoff has passed
+            self.failed_summaries += 1
+            self._consecutive_failures += 1
+            backoff = min(self.retry_backoff * 2 ** (self._consecutive_failures - 1), self.max_retry_backoff)
+            self._retry_at = time.monotonic() + backoff
+            logger.error(f"Conversation summarization failed (retrying in {backoff:.0f}s or later): {e}")
+            self._turns = self._folding + self._turns
+            self._folding = []
+            return
+        finally:
+            self._summary_task = None
+        # Still over budget after a successful fold: fold the next batch
+        self._maybe_fold()
+
+    def close(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total_turns": self.total_turns,
+            "recent_turns": len(self._turns) + len(self._folding),
+            "folded_turns": self.folded_turns,
+            "summaries": self.summaries,
+            "failed_summaries": self.failed_summaries,
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            "history_tokens": (estimate_tokens(self.summary) if self.summary else 0) + self._tokens(self._folding + self._turns),
+            "token_budget": self.token_budget,
+        }
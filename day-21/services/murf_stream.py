@@ -0,0 +1,255 @@
+# services/murf_stream.py
+import asyncio
+import json
+import logging
+import random
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+MURF_STREAM_URL = "wss://api.murf.ai/v1/speech/stream-input"
+
+
+class MurfTurn:
+    """
+    One turn's context on a shared Murf connection. Incoming frames for it land
+    in `queue`, which holds at most `queue_size` frames. A turn whose consumer
+    falls that far behind is failed on its own; the connection's reader never
+    waits for it, so other turns on the connection keep flowing.
+    """
+
+    def __init__(self, connection: "MurfStreamConnection", context_id: str, queue_size: int = 64):
+        self.connection = connection
+        self.context_id = context_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.finished = False
+
+    def fail(self, error: str):
+        """Ends the turn with an error frame, making room for it if the queue is full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"error": error, "final": True})
+
+    async def send_text(self, text: str, end: bool = False):
+        await self.connection.send({"context_id": self.context_id, "text": text, "end": end})
+
+
+class MurfStreamConnection:
+    """
+    A warm stream-input WebSocket multiplexing several turns by context id.
+    A reader task routes every incoming frame to its turn's queue without
+    ever blocking, so pings and other turns' audio are read on time.
+    """
+
+    def __init__(self, url: str, max_turns: int, name: str):
+        self.url = url
+        self.max_turns = max_turns
+        self.name = name
+        self.ws = None
+        self.turns: Dict[str, MurfTurn] = {}
+        self.healthy = False
+        self.dropped_frames = 0
+        self.overflowed_turns = 0
+        self._reader_task: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url)
+        self.healthy = True
+        self._reader_task = asyncio.create_task(self._reader())
+        logger.info(f"Murf stream connection {self.name} established")
+
+    async def send(self, payload: Dict[str, Any]):
+        async with self._send_lock:
+            await self.ws.send(json.dumps(payload))
+
+    async def _reader(self):
+        try:
+            async for message in self.ws:
+                data = json.loads(message)
+                if "context_id" in data:
+                    # Frames for a context whose turn already ended (or never existed) are dropped,
+                    # never handed to another session
+                    turn = self.turns.get(data["context_id"])
+                elif len(self.turns) == 1:
+                    # Frames without a context id belong to the only active turn
+                    turn = next(iter(self.turns.values()))
+                else:
+                    turn = None
+                if turn is not None:
+                    try:
+                        turn.queue.put_nowait(data)
+                    except asyncio.QueueFull:
+                        # Its consumer is too far behind; fail that turn alone and drop its later frames
+                        self.turns.pop(turn.context_id, None)
+                        self.overflowed_turns += 1
+                        logger.warning(f"Murf turn {turn.context_id} fell {turn.queue.maxsize} frames behind; failing it")
+                        turn.fail("Murf audio queue overflowed")
+                else:
+                    self.dropped_frames += 1
+                    logger.debug(f"Dropping Murf frame for unknown context {data.get('context_id')}")
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.warning(f"Murf stream connection {self.name} closed: {e}")
+        except Exception as e:
+            logger.error(f"Murf stream reader {self.name} failed: {e}")
+        finally:
+            self.healthy = False
+            # Unblock every turn still waiting on this connection
+            for turn in self.turns.values():
+                turn.fail("Murf connection lost")
+
+    async def ping(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(await self.ws.ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self.healthy = False
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+
+class MurfStreamManager:
+    """
+    Pool of warm Murf stream-input connections shared by every session.
+
+    Each turn gets a unique context id on the least loaded healthy connection,
+    so concurrent turns never collide and connection setup is off the per-turn
+    path. A background task pings every connection and reconnects dead ones
+    with exponential backoff. A turn that finds no free healthy connection
+    within `acquire_timeout` seconds fails with a ConnectionError.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        pool_size: int = 2,
+        max_turns_per_connection: int = 4,
+        sample_rate: int = 44100,
+        audio_format: str = "WAV",
+        health_interval: float = 15.0,
+        max_backoff: float = 30.0,
+        acquire_timeout: float = 10.0,
+        turn_queue_size: int = 64,
+    ):
+        self.url = (
+            f"{MURF_STREAM_URL}"
+            f"?api-key={api_key}"
+            f"&sample_rate={sample_rate}"
+            f"&channel_type=MONO"
+            f"&format={audio_format}"
+        )
+        self.pool_size = pool_size
+        self.max_turns_per_connection = max_turns_per_connection
+        self.health_interval = health_interval
+        self.max_backoff = max_backoff
+        self.acquire_timeout = acquire_timeout
+        self.turn_queue_size = turn_queue_size
+        self.connections: List[MurfStreamConnection] = []
+        self._capacity = asyncio.Condition()
+        self._health_task: Optional[asyncio.Task] = None
+        self._reconnecting: Dict[str, asyncio.Task] = {}
+        self.counters = {"turns": 0, "reconnects": 0, "failed_connects": 0, "acquire_timeouts": 0}
+
+    async def start(self):
+        for i in range(self.pool_size):
+            connection = MurfStreamConnection(self.url, self.max_turns_per_connection, f"murf-{i}")
+            self.connections.append(connection)
+            try:
+                await connection.connect()
+            except Exception as e:
+                self.counters["failed_connects"] += 1
+                logger.error(f"Could not open Murf stream connection {connection.name}: {e}")
+                self._schedule_reconnect(connection)
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    def _schedule_reconnect(self, connection: MurfStreamConnection):
+        if connection.name not in self._reconnecting:
+            self._reconnecting[connection.name] = asyncio.create_task(self._reconnect(connection))
+
+    async def _reconnect(self, connection: MurfStreamConnection):
+        attempt = 0
+        try:
+            while True:
+                delay = min(self.max_backoff, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2)
+                await asyncio.sleep(delay)
+                try:
+                    await connection.connect()
+                    self.counters["reconnects"] += 1
+                    async with self._capacity:
+                        self._capacity.notify_all()
+                    return
+                except Exception as e:
+                    attempt += 1
+                    self.counters["failed_connects"] += 1
+                    logger.warning(f"Reconnect of {connection.name} failed (attempt {attempt}): {e}")
+        finally:
+            self._reconnecting.pop(connection.name, None)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for connection in self.connections:
+                if connection.name in self._reconnecting:
+                    continue
+                if not connection.healthy or not await connection.ping(timeout=5):
+                    logger.warning(f"Murf stream connection {connection.name} unhealthy; reconnecting")
+                    await connection.close()
+                    self._schedule_reconnect(connection)
+
+    def _pick(self) -> Optional[MurfStreamConnection]:
+        candidates = [c for c in self.connections if c.healthy and len(c.turns) < c.max_turns]
+        return min(candidates, key=lambda c: len(c.turns)) if candidates else None
+
+    @asynccontextmanager
+    async def turn(self, voice_config: Dict[str, Any]) -> AsyncIterator[MurfTurn]:
+        """Opens a new context for one turn and releases it afterwards."""
+        async with self._capacity:
+            try:
+                await asyncio.wait_for(self._capacity.wait_for(lambda: self._pick() is not None), self.acquire_timeout)
+            except asyncio.TimeoutError:
+                # Every connection is down or full; fail this turn rather than hang it
+                self.counters["acquire_timeouts"] += 1
+                raise ConnectionError(f"No Murf stream connection available within {self.acquire_timeout:g}s")
+            connection = self._pick()
+            turn = MurfTurn(connection, f"turn-{uuid.uuid4().hex}", self.turn_queue_size)
+            connection.turns[turn.context_id] = turn
+        self.counters["turns"] += 1
+        try:
+            await connection.send({"context_id": turn.context_id, "voice_config": voice_config})
+            yield turn
+        finally:
+            connection.turns.pop(turn.context_id, None)
+            if not turn.finished and connection.healthy:
+                # Free the context on Murf's side if the turn ended early
+                try:
+                    await connection.send({"context_id": turn.context_id, "clear": True})
+                except Exception as e:
+                    logger.debug(f"Could not clear Murf context {turn.context_id}: {e}")
+            async with self._capacity:
+                self._capacity.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "connections": [
+                {"name": c.name, "healthy": c.healthy, "active_turns": len(c.turns), "dropped_frames": c.dropped_frames, "overflowed_turns": c.overflowed_turns}
+                for c in self.connections
+            ],
+        }
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+        for task in list(self._reconnecting.values()):
+            task.cancel()
+        for connection in self.connections:
+            await connection.close()
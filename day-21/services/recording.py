@@ -0,0 +1,366 @@
+# services/recording.py
+import logging
+import queue
+import random
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+SAMPLED = "sampled"
+FULL = "full"
+
+# ffmpeg encoder arguments and file extension per recording format; "pcm" is written as-is
+FORMATS = {
+    "flac": (["-c:a", "flac", "-compression_level", "5"], "flac"),
+    "opus": (["-c:a", "libopus", "-b:a", "24k", "-application", "voip"], "opus"),
+    "pcm": (None, "pcm"),
+}
+
+# Queue markers
+_CLOSE = object()
+_STOP = object()
+
+
+class _PcmWriter:
+    def __init__(self, path: Path, buffer_bytes: int):
+        self.path = path
+        self.error: Optional[Exception] = None
+        self.done = False
+        self._file = open(path, "wb", buffering=buffer_bytes)
+
+    def write(self, data: bytes) -> bool:
+        self._file.write(data)
+        return True
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            self.done = True
+
+    def join(self, timeout: float):
+        pass
+
+
+class _FfmpegWriter:
+    """
+    Compresses PCM into `path` with an ffmpeg process, fed through a large stdin buffer.
+
+    The pipe writes and the final wait for ffmpeg happen on the writer's own
+    feeder thread, so a slow ffmpeg only holds up its own recording. `write`
+    never blocks: it queues the chunk, or returns False when `max_chunks` are
+    already waiting. An ffmpeg that hasn't exited `close_timeout` seconds
+    after its input ends is killed; the sink also calls `kill` on one that is
+    stuck reading its input.
+    """
+
+    def __init__(self, path: Path, encoder_args, sample_rate: int, buffer_bytes: int, max_chunks: int, close_timeout: float = 30.0):
+        self.path = path
+        self.max_chunks = max_chunks
+        self.close_timeout = close_timeout
+        self.error: Optional[Exception] = None
+        self.done = False
+        self.closed_at: Optional[float] = None
+        self.killed = False
+        # Unbounded so the close marker always gets in; chunks are capped at `max_chunks` in write
+        self._chunks: queue.Queue = queue.Queue()
+        self._process = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+             *encoder_args, str(path)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            bufsize=buffer_bytes,
+        )
+        self._thread = threading.Thread(target=self._feed, name=f"recording-{path.stem}", daemon=True)
+        self._thread.start()
+
+    def write(self, data: bytes) -> bool:
+        if self.error is not None:
+            raise self.error
+        if self._chunks.qsize() >= self.max_chunks:
+            return False
+        self._chunks.put_nowait(data)
+        return True
+
+    def close(self):
+        self.closed_at = time.monotonic()
+        self._chunks.put_nowait(_CLOSE)
+
+    def join(self, timeout: float):
+        self._thread.join(timeout)
+
+    def kill(self):
+        # Fails the feeder's blocked pipe write, so its thread finishes
+        self.killed = True
+        self._process.kill()
+
+    def _feed(self):
+        try:
+            while (data := self._chunks.get()) is not _CLOSE:
+                self._process.stdin.write(data)
+            self._process.stdin.close()
+            self._process.wait(timeout=self.close_timeout)
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            self.error = e
+            logger.error(f"Recording {self.path} failed: {e}")
+            self._process.kill()
+            self._process.wait()
+        finally:
+            self.done = True
+
+
+class SessionRecorder:
+    """One session's handle on the sink. `write` never blocks; chunks that don't fit in the queue are dropped."""
+
+    def __init__(self, sink: "RecordingSink", session_id: str):
+        self._sink = sink
+        self.session_id = session_id
+        self.closed = False
+
+    def write(self, data: bytes):
+        if not self.closed:
+            self._sink._enqueue(self.session_id, data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._sink._enqueue(self.session_id, _CLOSE)
+
+
+class RecordingSink:
+    """
+    Records incoming /ws microphone audio without touching the disk on the event loop.
+
+    `mode` is "off" (nothing is recorded), "sampled" (a `sample_ratio` share
+    of sessions) or "full". Chunks go through a bounded queue to a single
+    writer thread, which writes them through large buffers and, for "flac"
+    or "opus", hands them to one ffmpeg process per session. Each ffmpeg is
+    fed and reaped by its own thread, so a slow encoder never stalls the
+    other sessions. If a queue is full, chunks are dropped (and counted), so
+    the receive loop never waits.
+
+    The writer thread also applies retention to `directory`. It deletes
+    recordings older than `max_age` seconds. It then deletes the oldest
+    recordings until they fit in `max_bytes`. No new recording is started
+    while the disk has less than `min_free_bytes` free.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        mode: str = OFF,
+        sample_ratio: float = 0.1,
+        audio_format: str = "flac",
+        sample_rate: int = 16000,
+        max_bytes: int = 500 * 1024 * 1024,
+        max_age: float = 7 * 24 * 3600,
+        min_free_bytes: int = 1024 * 1024 * 1024,
+        queue_chunks: int = 1024,
+        buffer_bytes: int = 1024 * 1024,
+        prune_interval: float = 60.0,
+        close_timeout: float = 30.0,
+    ):
+        if mode not in (OFF, SAMPLED, FULL):
+            raise ValueError(f"Unknown recording mode: {mode}")
+        if audio_format not in FORMATS:
+            raise ValueError(f"Unknown recording format: {audio_format}")
+        if mode != OFF and FORMATS[audio_format][0] and not shutil.which("ffmpeg"):
+            logger.warning(f"ffmpeg not found; recordings will be raw PCM instead of {audio_format}.")
+            audio_format = "pcm"
+        self.directory = Path(directory)
+        self.mode = mode
+        self.sample_ratio = sample_ratio
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_free_bytes = min_free_bytes
+        self.buffer_bytes = buffer_bytes
+        self.prune_interval = prune_interval
+        self.close_timeout = close_timeout
+        self.queue_chunks = queue_chunks
+        # Unbounded so close markers always get in; audio chunks are capped at `queue_chunks` in _enqueue
+        self._queue: queue.Queue = queue.Queue()
+        self._writers: Dict[str, Any] = {}
+        # Closed writers whose ffmpeg is still finishing the file
+        self._finishing: List[Any] = []
+        self._refused = set()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {
+            "sessions_recorded": 0, "sessions_skipped": 0, "sessions_refused": 0,
+            "bytes_in": 0, "dropped_chunks": 0, "write_errors": 0,
+            "files_deleted": 0, "bytes_deleted": 0,
+        }
+
+    def start(self):
+        """Starts the writer thread, unless recording is off."""
+        if self.mode != OFF and self._thread is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="recording-writer", daemon=True)
+            self._thread.start()
+
+    def open(self, session_id: str) -> Optional[SessionRecorder]:
+        """A recorder for this session, or None when it is not being recorded."""
+        if self._thread is None:
+            return None
+        if self.mode == SAMPLED and random.random() >= self.sample_ratio:
+            self.counters["sessions_skipped"] += 1
+            return None
+        return SessionRecorder(self, session_id)
+
+    def _enqueue(self, session_id: str, data):
+        if data is not _CLOSE:
+            if self._queue.qsize() >= self.queue_chunks:
+                self.counters["dropped_chunks"] += 1
+                return
+            self.counters["bytes_in"] += len(data)
+        self._queue.put_nowait((session_id, data))
+
+    # --- Writer thread ---
+
+    def _run(self):
+        last_prune = 0.0
+        while True:
+            try:
+                item = self._queue.get(timeout=self.prune_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                session_id, data = item
+                if data is _CLOSE:
+                    self._finish(session_id)
+                else:
+                    self._write(session_id, data)
+            if time.monotonic() - last_prune >= self.prune_interval:
+                self._enforce_retention()
+                last_prune = time.monotonic()
+        for session_id in list(self._writers):
+            self._finish(session_id)
+        for writer in self._finishing:
+            writer.join(self.close_timeout)
+            if not writer.done:
+                writer.kill()
+        self._enforce_retention()
+
+    def _write(self, session_id: str, data: bytes):
+        if session_id in self._refused:
+            return
+        writer = self._writers.get(session_id)
+        if writer is None:
+            writer = self._open_writer(session_id)
+            if writer is None:
+                return
+        try:
+            if not writer.write(data):
+                self.counters["dropped_chunks"] += 1
+        except (OSError, ValueError) as e:
+            # A failed ffmpeg has logged already and is counted once it is reaped
+            if e is not writer.error:
+                self.counters["write_errors"] += 1
+                logger.error(f"Recording write failed for {session_id}: {e}")
+            self._finish(session_id)
+            self._refused.add(session_id)
+
+    def _open_writer(self, session_id: str):
+        if shutil.disk_usage(self.directory).free < self.min_free_bytes:
+            logger.warning(f"Not recording session {session_id}: disk has less than {self.min_free_bytes} bytes free")
+            self.counters["sessions_refused"] += 1
+            self._refused.add(session_id)
+            return None
+        encoder_args, extension = FORMATS[self.audio_format]
+        path = self.directory / f"streamed_{session_id}.{extension}"
+        try:
+            if encoder_args:
+                writer = _FfmpegWriter(path, encoder_args, self.sample_rate, self.buffer_bytes, self.queue_chunks, self.close_timeout)
+            else:
+                writer = _PcmWriter(path, self.buffer_bytes)
+        except OSError as e:
+            self.counters["write_errors"] += 1
+            logger.error(f"Could not start recording {path}: {e}")
+            self._refused.add(session_id)
+            return None
+        self._writers[session_id] = writer
+        self.counters["sessions_recorded"] += 1
+        return writer
+
+    def _finish(self, session_id: str):
+        self._refused.discard(session_id)
+        writer = self._writers.pop(session_id, None)
+        if writer is not None:
+            try:
+                writer.close()
+            except OSError as e:
+                self.counters["write_errors"] += 1
+                logger.error(f"Could not finish recording {writer.path}: {e}")
+                return
+            self._finishing.append(writer)
+
+    def _reap_finished(self):
+        still_finishing = []
+        for writer in self._finishing:
+            if writer.done:
+                if writer.error is not None:
+                    self.counters["write_errors"] += 1
+                continue
+            # The feeder kills ffmpeg itself once its input is in; this catches one stuck before that
+            if not writer.killed and time.monotonic() - writer.closed_at > 2 * self.close_timeout:
+                logger.warning(f"Killing ffmpeg still finishing {writer.path}")
+                writer.kill()
+            still_finishing.append(writer)
+        self._finishing = still_finishing
+
+    def _enforce_retention(self):
+        self._reap_finished()
+        active = {writer.path for writer in [*self._writers.values(), *self._finishing]}
+        files = []
+        for path in self.directory.glob("streamed_*"):
+            if path in active:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not delete old recording {path}: {e}")
+                continue
+            total -= size
+            self.counters["files_deleted"] += 1
+            self.counters["bytes_deleted"] += size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "mode": self.mode,
+            "format": self.audio_format,
+            "recording": len(self._writers),
+            "finishing": len(self._finishing),
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def close(self, timeout: float = 10.0):
+        """Finishes every open recording, then stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put_nowait(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,86 @@
+# services/scheduler.py
+import asyncio
+import concurrent.futures
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TurnFactory = Callable[[], Awaitable[Any]]
+
+
+class TurnScheduler:
+    """
+    Runs conversation turns as tasks on the server's own event loop.
+
+    - At most `max_concurrent_turns` turns run at once across all sessions;
+      the rest wait for a slot.
+    - Each session has at most one turn in flight. A turn submitted while
+      another is running waits as that session's pending turn; a newer
+      submission replaces an older pending one.
+    - Callback threads (e.g. AssemblyAI's) hand turns over with
+      `submit_threadsafe`, so no thread or event loop is created per turn.
+    """
+
+    def __init__(self, max_concurrent_turns: int = 16):
+        self.max_concurrent_turns = max_concurrent_turns
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._pending: Dict[str, TurnFactory] = {}
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "superseded": 0, "cancelled": 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attaches the scheduler to the server loop. Call once at startup."""
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_concurrent_turns)
+
+    def submit(self, session_id: str, make_turn: TurnFactory):
+        """Schedules a turn for `session_id`. Must be called on the server loop."""
+        self.counters["submitted"] += 1
+        if session_id in self._running:
+            if session_id in self._pending:
+                self.counters["superseded"] += 1
+            self._pending[session_id] = make_turn
+            return
+        self._running[session_id] = self._loop.create_task(self._run(session_id, make_turn))
+
+    def submit_threadsafe(self, session_id: str, make_turn: TurnFactory) -> concurrent.futures.Future:
+        """Hands a turn over from another thread onto the server loop."""
+
+        async def enqueue():
+            self.submit(session_id, make_turn)
+
+        return asyncio.run_coroutine_threadsafe(enqueue(), self._loop)
+
+    async def _run(self, session_id: str, make_turn: TurnFactory):
+        try:
+            while make_turn is not None:
+                async with self._slots:
+                    try:
+                        await make_turn()
+                        self.counters["completed"] += 1
+                    except asyncio.CancelledError:
+                        self.counters["cancelled"] += 1
+                        raise
+                    except Exception as e:
+                        self.counters["failed"] += 1
+                        logger.error(f"Turn failed for session {session_id}: {e}")
+                make_turn = self._pending.pop(session_id, None)
+        finally:
+            self._running.pop(session_id, None)
+
+    def cancel_session(self, session_id: str):
+        """Drops the session's pending turn and cancels the one in flight."""
+        self._pending.pop(session_id, None)
+        task = self._running.get(session_id)
+        if task is not None:
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "in_flight": len(self._running),
+            "pending": len(self._pending),
+            "max_concurrent_turns": self.max_concurrent_turns,
+        }
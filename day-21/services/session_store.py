@@ -0,0 +1,264 @@
+# services/session_store.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+_ROLE_CODES = {"user": "u", "model": "m"}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+def _content_fields(content: Any) -> Tuple[str, List[str]]:
+    """Returns (role, texts) for a history entry, whether a dict or a Gemini Content proto."""
+    if isinstance(content, dict):
+        role, parts = content.get("role", "user"), content.get("parts", [])
+    else:
+        role, parts = content.role, content.parts
+    texts = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict):
+            texts.append(part.get("text", ""))
+        else:
+            texts.append(part.text)
+    return role, texts
+
+
+def serialize_history(history: List[Any], max_messages: Optional[int] = None) -> bytes:
+    """
+    Compact JSON encoding of a Gemini chat history: [["u", text, ...], ["m", text, ...], ...].
+    Only text parts are kept. With `max_messages`, the oldest messages are dropped
+    (in user/model pairs so the history still starts with a user turn).
+    """
+    if max_messages is not None and len(history) > max_messages:
+        drop = len(history) - max_messages
+        history = history[drop + drop % 2:]
+    rows = []
+    for content in history:
+        role, texts = _content_fields(content)
+        rows.append([_ROLE_CODES.get(role, role), *texts])
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def deserialize_history(data: Optional[bytes]) -> List[Dict[str, Any]]:
+    """Inverse of `serialize_history`; returns dicts accepted by `start_chat(history=...)`."""
+    if not data:
+        return []
+    return [{"role": _CODE_ROLES.get(row[0], row[0]), "parts": row[1:]} for row in json.loads(data)]
+
+
+class SessionStore(ABC):
+    """
+    Storage for per-session chat histories. Entries expire `ttl` seconds after
+    their last write, so abandoned sessions don't accumulate.
+    """
+
+    def __init__(self, ttl: Optional[float] = 86400, max_messages: Optional[int] = None):
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+    def get(self, session_id: str) -> List[Dict[str, Any]]:
+        return deserialize_history(self._get(session_id))
+
+    def set(self, session_id: str, history: List[Any]):
+        self._set(session_id, serialize_history(history, self.max_messages))
+
+    @abstractmethod
+    def _get(self, session_id: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def _set(self, session_id: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Single-process store; the old module-global dict behaviour, plus TTL."""
+
+    def __init__(self, ttl: Optional[float] = 86400, max_messages: Optional[int] = None):
+        super().__init__(ttl, max_messages)
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[session_id]
+                return None
+            return data
+
+    def _set(self, session_id: str, data: bytes):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[session_id] = (data, expires_at)
+            # Opportunistic sweep so expired sessions don't pile up
+            if len(self._data) % 256 == 0:
+                now = time.time()
+                for key in [k for k, (_, exp) in self._data.items() if exp is not None and exp < now]:
+                    del self._data[key]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite store in WAL mode, shareable by several uvicorn workers on one host.
+
+    Writes are buffered and flushed in batches by a background thread every
+    `flush_interval` seconds (or once `batch_size` writes are pending). Reads
+    see pending writes immediately.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = 86400,
+        max_messages: Optional[int] = None,
+        flush_interval: float = 0.5,
+        batch_size: int = 64,
+    ):
+        super().__init__(ttl, max_messages)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, history BLOB NOT NULL, expires_at REAL)"
+        )
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, Tuple[Optional[bytes], Optional[float]]] = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-store-flush", daemon=True)
+        self._flusher.start()
+
+    def _get(self, session_id: str) -> Optional[bytes]:
+        now = time.time()
+        with self._pending_lock:
+            if session_id in self._pending:
+                data, expires_at = self._pending[session_id]
+                return data if expires_at is None or expires_at >= now else None
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT history FROM sessions WHERE id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (session_id, now),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _queue(self, session_id: str, data: Optional[bytes], expires_at: Optional[float]):
+        with self._pending_lock:
+            self._pending[session_id] = (data, expires_at)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def _set(self, session_id: str, data: bytes):
+        self._queue(session_id, data, time.time() + self.ttl if self.ttl else None)
+
+    def delete(self, session_id: str):
+        self._queue(session_id, None, None)
+
+    def flush(self):
+        with self._pending_lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        upserts = [(sid, data, exp) for sid, (data, exp) in batch.items() if data is not None]
+        deletes = [(sid,) for sid, (data, _) in batch.items() if data is None]
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO sessions (id, history, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET history = excluded.history, expires_at = excluded.expires_at",
+                    upserts,
+                )
+                self._conn.executemany("DELETE FROM sessions WHERE id = ?", deletes)
+                self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session store flush failed: {e}")
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        self._conn.close()
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store for any Redis-protocol server, so several uvicorn workers or hosts
+    can serve the same session. Pass `client` to use an existing (or fake) client.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        ttl: Optional[float] = 86400,
+        max_messages: Optional[int] = None,
+        client: Any = None,
+        prefix: str = "chat:",
+    ):
+        super().__init__(ttl, max_messages)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _get(self, session_id: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + session_id)
+
+    def _set(self, session_id: str, data: bytes):
+        self.client.set(self.prefix + session_id, data, ex=int(self.ttl) if self.ttl else None)
+
+    def delete(self, session_id: str):
+        self.client.delete(self.prefix + session_id)
+
+    def close(self):
+        self.client.close()
+
+
+def create_session_store(url: str, ttl: Optional[float] = 86400, max_messages: Optional[int] = None) -> SessionStore:
+    """Builds a store from a URL: memory://, sqlite:///path/to.db or redis://host:port/db."""
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return InMemorySessionStore(ttl, max_messages)
+    if scheme == "sqlite":
+        return SQLiteSessionStore(url[len("sqlite:///"):], ttl, max_messages)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisSessionStore(url, ttl, max_messages)
+    raise ValueError(f"Unsupported session store URL: {url}")
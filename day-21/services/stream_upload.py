@@ -0,0 +1,202 @@
+# services/stream_upload.py
+import asyncio
+import logging
+import shutil
+from typing import AsyncIterator, Dict, List, Optional
+
+import assemblyai as aai
+import httpx
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# Containers browsers record into (MediaRecorder); everything else is uploaded as-is
+TRANSCODE_CONTENT_TYPES = ("audio/webm", "video/webm", "audio/ogg", "audio/opus")
+PIPE_CHUNK_BYTES = 64 * 1024
+
+
+class StreamingUpload:
+    """
+    Streams one file field of a multipart request straight to AssemblyAI's
+    upload endpoint while the body is still arriving.
+
+    Nothing is spooled: each chunk read from the client is parsed, optionally
+    pushed through an ffmpeg subprocess (WebM/Opus -> 16 kHz mono PCM WAV),
+    and written to the upload request before the next chunk is read. Memory
+    per request is therefore bounded by one body chunk plus the pipe buffers,
+    and a slow upload pushes back on the client's socket instead of piling up.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        field: str = "audio_file",
+        transcode: bool = False,
+        sample_rate: int = 16000,
+        api_key: Optional[str] = None,
+    ):
+        self.request = request
+        self.field = field
+        self.transcode = transcode
+        self.sample_rate = sample_rate
+        self.api_key = api_key or aai.settings.api_key
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.transcoded = False
+        self.bytes_received = 0
+        self.bytes_uploaded = 0
+        self.max_pending_bytes = 0
+
+    async def upload(self) -> str:
+        """Uploads the file field and returns AssemblyAI's `upload_url`."""
+        chunks = self._file_chunks()
+        # The part headers arrive with the first body chunks, so peek to learn the content type
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            raise ValueError(f"The '{self.field}' file field is empty")
+        if self.transcode and (self.content_type or "").startswith(TRANSCODE_CONTENT_TYPES):
+            if shutil.which("ffmpeg"):
+                self.transcoded = True
+                chunks = self._transcode(_prepend(first, chunks))
+            else:
+                logger.warning("ffmpeg not found; uploading the recording without transcoding.")
+                chunks = _prepend(first, chunks)
+        else:
+            chunks = _prepend(first, chunks)
+
+        async with httpx.AsyncClient(base_url=aai.settings.base_url, timeout=aai.settings.http_timeout) as client:
+            response = await client.post(
+                "/v2/upload",
+                headers={"authorization": self.api_key, "content-type": "application/octet-stream"},
+                content=self._count_uploaded(chunks),
+            )
+        if response.status_code != 200:
+            raise Exception(f"AssemblyAI upload failed ({response.status_code}): {response.text}")
+        return response.json()["upload_url"]
+
+    async def _file_chunks(self) -> AsyncIterator[bytes]:
+        """Yields the bytes of the `field` part as they are parsed from the request body."""
+        content_type, params = parse_options_header(self.request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise ValueError("Expected a multipart/form-data request body")
+
+        pending: List[bytes] = []
+        part: Dict[str, object] = {}
+        header = {"field": b"", "value": b""}
+        state = {"in_field": False, "seen": False, "complete": False}
+
+        def on_part_begin():
+            part.clear()
+
+        def on_header_field(data: bytes, start: int, end: int):
+            header["field"] += data[start:end]
+
+        def on_header_value(data: bytes, start: int, end: int):
+            header["value"] += data[start:end]
+
+        def on_header_end():
+            part[header["field"].decode("latin-1").lower()] = header["value"].decode("latin-1")
+            header["field"] = header["value"] = b""
+
+        def on_headers_finished():
+            _, options = parse_options_header(part.get("content-disposition", ""))
+            name = options.get(b"name", b"").decode("latin-1")
+            state["in_field"] = name == self.field and not state["seen"]
+            if state["in_field"]:
+                state["seen"] = True
+                self.filename = options.get(b"filename", b"").decode("latin-1") or None
+                self.content_type = part.get("content-type")
+
+        def on_part_data(data: bytes, start: int, end: int):
+            if state["in_field"]:
+                pending.append(data[start:end])
+
+        def on_part_end():
+            if state["in_field"]:
+                state["complete"] = True
+            state["in_field"] = False
+
+        parser = MultipartParser(params[b"boundary"], callbacks={
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+
+        async for chunk in self.request.stream():
+            self.bytes_received += len(chunk)
+            parser.write(chunk)
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                self.max_pending_bytes = max(self.max_pending_bytes, len(data))
+                yield data
+            if state["complete"]:
+                # Finish the upload now rather than waiting on any trailing form fields
+                return
+        parser.finalize()
+        if not state["seen"]:
+            raise ValueError(f"Multipart body has no '{self.field}' file field")
+
+    async def _transcode(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pipes `chunks` through ffmpeg and yields 16 kHz mono 16-bit PCM in a WAV container."""
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-ac", "1", "-ar", str(self.sample_rate), "-acodec", "pcm_s16le", "-f", "wav",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        async def feed():
+            try:
+                async for chunk in chunks:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                process.stdin.close()
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while chunk := await process.stdout.read(PIPE_CHUNK_BYTES):
+                yield chunk
+            await feeder
+            stderr = await process.stderr.read()
+            if await process.wait() != 0:
+                raise Exception(f"ffmpeg failed to transcode the recording: {stderr.decode(errors='replace').strip()}")
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def _count_uploaded(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            self.bytes_uploaded += len(chunk)
+            yield chunk
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "transcoded": self.transcoded,
+            "bytes_received": self.bytes_received,
+            "bytes_uploaded": self.bytes_uploaded,
+            "max_pending_bytes": self.max_pending_bytes,
+        }
+
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in rest:
+        yield chunk
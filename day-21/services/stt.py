@@ -2,12 +2,16 @@
 import assemblyai as aai
 from fastapi import UploadFile
 
-def transcribe_audio(audio_file: UploadFile) -> str:
-    """Transcribes audio to text using AssemblyAI."""
+def transcribe_source(source) -> str:
+    """Transcribes a file path or file object to text using AssemblyAI. Blocks until done."""
     transcriber = aai.Transcriber()
-    transcript = transcriber.transcribe(audio_file.file)
+    transcript = transcriber.transcribe(source)
 
     if transcript.status == aai.TranscriptStatus.error or not transcript.text:
         raise Exception(f"Transcription failed: {transcript.error or 'No speech detected'}")
 
-    return transcript.text
\ No newline at end of file
+    return transcript.text
+
+def transcribe_audio(audio_file: UploadFile) -> str:
+    """Transcribes audio to text using AssemblyAI."""
+    return transcribe_source(audio_file.file)
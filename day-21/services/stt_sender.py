@@ -0,0 +1,152 @@
+# services/stt_sender.py
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, Union
+
+import config
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+BACKPRESSURE = "backpressure"
+
+# Shared by every session's sender; each session keeps at most one call in flight
+stt_executor = ThreadPoolExecutor(max_workers=config.STT_SEND_WORKERS, thread_name_prefix="stt-send")
+
+
+class STTSender:
+    """
+    Moves the STT provider's synchronous send (e.g. `StreamingClient.stream`)
+    off the event loop.
+
+    Audio is queued per session, up to `max_queued` chunks. A worker task
+    hands the chunks, in order, to `send` on a shared thread pool. When the
+    queue is full, the policy decides what happens:
+      - "drop_oldest": the oldest queued chunk is discarded, so latency stays bounded
+      - "backpressure": `send` waits for room, which stops the receive loop
+        from reading and pushes back on the client's socket
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], Any],
+        max_queued: int = 50,
+        policy: str = DROP_OLDEST,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        if policy not in (DROP_OLDEST, BACKPRESSURE):
+            raise ValueError(f"Unknown STT overflow policy: {policy}")
+        self._send = send
+        self.max_queued = max_queued
+        self.policy = policy
+        self._executor = executor or stt_executor
+        # Audio chunks, plus control calls (e.g. force_endpoint) that must follow them in order
+        self._queue: Deque[Tuple[Union[bytes, Callable[[], Any]], float]] = deque()
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._closing = False
+        self._worker = asyncio.create_task(self._run())
+        self.sent_chunks = 0
+        self.sent_bytes = 0
+        self.dropped_chunks = 0
+        self.dropped_bytes = 0
+        self.failed_chunks = 0
+        self.backpressure_waits = 0
+        self.max_depth = 0
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+
+    async def send(self, chunk: bytes):
+        """Queues a chunk, waiting for room under the backpressure policy."""
+        if self.policy == BACKPRESSURE:
+            while len(self._queue) >= self.max_queued and not self._closing:
+                self.backpressure_waits += 1
+                self._room.clear()
+                await self._room.wait()
+        self.send_nowait(chunk)
+
+    def send_nowait(self, chunk: bytes):
+        """Queues a chunk without waiting; a full queue always drops its oldest chunk."""
+        if self._closing:
+            return
+        while len(self._queue) >= self.max_queued and self._drop_oldest_chunk():
+            pass
+        self._enqueue(chunk)
+
+    def send_control(self, call: Callable[[], Any]):
+        """Runs `call` on the worker once everything queued before it has been sent."""
+        if not self._closing:
+            self._enqueue(call)
+
+    def _enqueue(self, item: Union[bytes, Callable[[], Any]]):
+        self._queue.append((item, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+
+    def _drop_oldest_chunk(self) -> bool:
+        for index, (item, _) in enumerate(self._queue):
+            if isinstance(item, (bytes, bytearray)):
+                del self._queue[index]
+                self.dropped_chunks += 1
+                self.dropped_bytes += len(item)
+                return True
+        return False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queue:
+                if self._closing:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            item, queued_at = self._queue.popleft()
+            self._room.set()
+            if callable(item):
+                try:
+                    await loop.run_in_executor(self._executor, item)
+                except Exception as e:
+                    logger.error(f"STT control call failed: {e}")
+                continue
+            chunk = item
+            lag = time.monotonic() - queued_at
+            self.max_lag = max(self.max_lag, lag)
+            self._lag_total += lag
+            try:
+                await loop.run_in_executor(self._executor, self._send, chunk)
+                self.sent_chunks += 1
+                self.sent_bytes += len(chunk)
+            except Exception as e:
+                self.failed_chunks += 1
+                logger.error(f"STT send failed: {e}")
+
+    async def close(self, drain_timeout: float = 1.0):
+        """Sends what is still queued (for up to `drain_timeout` seconds), then stops."""
+        self._closing = True
+        self._ready.set()
+        self._room.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._worker), drain_timeout)
+        except asyncio.TimeoutError:
+            self._worker.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        handled = self.sent_chunks + self.failed_chunks
+        return {
+            "policy": self.policy,
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_depth,
+            "sent_chunks": self.sent_chunks,
+            "sent_bytes": self.sent_bytes,
+            "dropped_chunks": self.dropped_chunks,
+            "dropped_bytes": self.dropped_bytes,
+            "failed_chunks": self.failed_chunks,
+            "backpressure_waits": self.backpressure_waits,
+            "avg_lag_ms": round(self._lag_total * 1000 / handled, 1) if handled else None,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
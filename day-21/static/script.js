@@ -152,20 +152,18 @@ document.addEventListener("DOMContentLoaded", async () => {
                         }, 2000);
 
                     } else if (data.type === "audio_chunk") {
-                        // Handle streaming audio chunks
-                        console.log(`[Day 21] Received audio chunk ${data.chunk_index}/${data.total_chunks}`);
+                        // Chunks are relayed as Murf produces them, so the total is only known at audio_complete
+                        console.log(`[Day 21] Received audio chunk ${data.chunk_index}`);
                         console.log(`[Day 21] Audio chunk size: ${data.audio_data ? data.audio_data.length : 0} characters`);
-                        console.log(`[Day 21] Is final chunk: ${data.is_final}`);
                         
                         // Start new audio session if needed
                         if (!currentAudioSession) {
                             currentAudioSession = {
                                 startTime: Date.now(),
-                                expectedChunks: data.total_chunks,
                                 receivedChunks: 0
                             };
                             audioChunks = [];
-                            console.log(`[Day 21] Started new audio session - expecting ${data.total_chunks} chunks`);
+                            console.log(`[Day 21] Started new audio session`);
                         }
                         
                         // Add chunk to array
@@ -173,19 +171,15 @@ document.addEventListener("DOMContentLoaded", async () => {
                             audioChunks.push(data.audio_data);
                             currentAudioSession.receivedChunks++;
                             
+                            if (currentAudioSession.receivedChunks === 1) {
+                                console.log(`[Day 21] First audio chunk after ${Date.now() - currentAudioSession.startTime}ms`);
+                            }
+                            
                             // Log acknowledgement
                             console.log(`[Day 21] ACKNOWLEDGEMENT: Audio chunk ${data.chunk_index} received and stored`);
-                            console.log(`[Day 21] Progress: ${currentAudioSession.receivedChunks}/${currentAudioSession.expectedChunks} chunks received`);
                             
                             // Update status
-                            statusDisplay.textContent = `Receiving audio: ${currentAudioSession.receivedChunks}/${currentAudioSession.expectedChunks} chunks`;
-                        }
-                        
-                        if (data.is_final) {
-                            const duration = Date.now() - currentAudioSession.startTime;
-                            console.log(`[Day 21] FINAL CHUNK received - Audio session completed in ${duration}ms`);
-                            console.log(`[Day 21] Total chunks accumulated: ${audioChunks.length}`);
-                            statusDisplay.textContent = `Audio received (${audioChunks.length} chunks). Ready for next turn.`;
+                            statusDisplay.textContent = `Receiving audio: ${currentAudioSession.receivedChunks} chunks`;
                         }
 
                     } else if (data.type === "audio_complete") {
@@ -198,9 +192,9 @@ document.addEventListener("DOMContentLoaded", async () => {
                             const duration = Date.now() - currentAudioSession.startTime;
                             console.log(`[Day 21] Audio session summary:`);
                             console.log(`[Day 21] - Duration: ${duration}ms`);
-                            console.log(`[Day 21] - Expected chunks: ${currentAudioSession.expectedChunks}`);
+                            console.log(`[Day 21] - Expected chunks: ${data.total_chunks}`);
                             console.log(`[Day 21] - Received chunks: ${currentAudioSession.receivedChunks}`);
-                            console.log(`[Day 21] - Success rate: ${(currentAudioSession.receivedChunks / currentAudioSession.expectedChunks * 100).toFixed(1)}%`);
+                            console.log(`[Day 21] - Success rate: ${(currentAudioSession.receivedChunks / Math.max(data.total_chunks, 1) * 100).toFixed(1)}%`);
                         }
                         
                         statusDisplay.textContent = "AI response received. Continue speaking or stop recording.";
@@ -9,6 +9,7 @@ import asyncio
 import re
 import logging
 import os
+import uuid
 from typing import List, Dict, Any, Tuple
 
 # Configure logging
@@ -132,7 +133,8 @@ async def get_llm_streaming_response_with_murf(user_query: str, history: List[Di
     if not MURF_API_KEY:
         raise ValueError("Murf API key is missing.")
 
-    context_id = "day20-static-context"  # Static context_id for Murf to avoid context limit errors
+    # A fresh context per call, so concurrent calls never share (or clear) one another's audio
+    context_id = f"turn-{uuid.uuid4().hex}"
 
     try:
         # Connect to Murf WebSocket
@@ -3,12 +3,19 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import logging
 import asyncio
-import base64
-import re
 import json
+import itertools
+from typing import List, Optional
+from uuid import uuid4
 
 # Import services and the config module
-from services import stt, llm, tts, weather # Import the new weather service
+from services import stt, llm, tts, weather, pipeline, protocol, uplink, downlink # Import the new weather service
+from services.memory import ConversationMemory
+from services.speculation import SpeculativeTurns
+from services.vad import EnergyZcrModel, VoiceActivityGate
+from services.framing import PcmReframer
+from services.stt_sender import STTSender
+from services.stt_pool import STTSessionPool
 import config as app_config
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,10 +23,56 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+WEATHER_KEYWORDS = ["weather", "mausam", "temperature", "tapman"]
+
+# Connected AssemblyAI sessions handed out as /ws clients arrive, per (API key, sample rate)
+stt_pool = STTSessionPool(size_per_key=app_config.STT_POOL_SIZE, idle_ttl=app_config.STT_POOL_IDLE_TTL)
+
+# Conversation memory, speculation, VAD, framing, STT send, uplink decode and downlink bandwidth counters of every connected /ws session, for metrics
+sessions = {}
+speculators = {}
+vad_gates = {}
+reframers = {}
+stt_senders = {}
+uplink_decoders = {}
+downlink_meters = {}
+
 @app.get("/")
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "tts": tts.client_manager.metrics(),
+        "tts_cache": tts.audio_cache.stats() if tts.audio_cache else None,
+        "llm_models": llm.model_registry.stats(),
+        "llm_prompts": llm.persona_registry.stats(),
+        "sessions": {session_id: memory.stats() for session_id, memory in sessions.items()},
+        "speculation": {session_id: speculator.stats() for session_id, speculator in speculators.items()},
+        "vad": {session_id: gate.stats() for session_id, gate in vad_gates.items()},
+        "stt_framing": {session_id: reframer.stats() for session_id, reframer in reframers.items()},
+        "stt_send": {session_id: sender.stats() for session_id, sender in stt_senders.items()},
+        "uplink": {session_id: decoder.stats() for session_id, decoder in uplink_decoders.items()},
+        "downlink": {session_id: meter.stats() for session_id, meter in downlink_meters.items()},
+        "downlink_totals": downlink.totals_stats(),
+        "stt_pool": stt_pool.stats(),
+    }
+
+@app.on_event("startup")
+async def startup():
+    stt_pool.start()
+    if app_config.STT_POOL_SIZE:
+        # /ws uses each client's own key, so only keys clients are known to send are worth a billed warm session
+        for api_key in app_config.STT_POOL_KEEP_WARM_KEYS:
+            stt_pool.warm(api_key, keep_warm=True)
+
+@app.on_event("shutdown")
+def shutdown():
+    tts.client_manager.close()
+    llm.blocking_executor.shutdown(wait=False, cancel_futures=True)
+    stt_pool.close()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -37,90 +90,370 @@ async def websocket_endpoint(websocket: WebSocket):
         WEATHER_API_KEY = api_keys.get("weather")
         
         persona = config.get("persona", "zarex")
+        # Clients that don't announce a protocol version get base64-in-JSON audio
+        wire_protocol = int(config.get("protocol", 0))
+        tts_options = config.get("tts", {})
+        speculate = bool(config.get("speculation", app_config.SPECULATION_ENABLED))
+        # Clients that report which sentences finished playing get only those recorded after a barge-in
+        reports_playback = bool(config.get("playback_reports", False))
+        # Microphone format, e.g. ["webm-opus", "pcm16"] in order of preference; clients that don't say send PCM
+        uplink_codec = uplink.negotiate(config.get("uplink"), app_config.UPLINK_CODECS)
+        # Assistant audio format, from the codecs the client says it can play
+        downlink_format = downlink.negotiate(
+            config.get("downlink"),
+            wire_protocol,
+            app_config.DOWNLINK_CODECS,
+            app_config.DOWNLINK_SAMPLE_RATE,
+            app_config.DOWNLINK_OPUS_BITRATE,
+        )
         
         if not all([MURF_API_KEY, ASSEMBLYAI_API_KEY, GEMINI_API_KEY]):
             logging.error("Missing one or more required API keys.")
             await websocket.close(code=1008, reason="Missing API Keys")
             return
             
-        logging.info(f"Config received. Persona: {persona}")
+        logging.info(f"Config received. Persona: {persona}, protocol v{wire_protocol}, uplink {uplink_codec}, "
+                     f"downlink {downlink_format.codec}@{downlink_format.sample_rate}")
+
+        # Count the persona prompt and register it as cached content before the first turn
+        llm.persona_registry.warm(GEMINI_API_KEY, persona)
 
-    except (json.JSONDecodeError, KeyError, WebSocketDisconnect) as e:
+        # Only lowers the limit, and only for a key the client brought (not the server's MURF_API_KEY)
+        if "max_concurrency" in tts_options:
+            tts.client_manager.set_concurrency_limit(MURF_API_KEY, int(tts_options["max_concurrency"]))
+
+    except (json.JSONDecodeError, KeyError, ValueError, WebSocketDisconnect) as e:
         logging.error(f"Error receiving/parsing config: {e}")
         await websocket.close(code=1003, reason="Invalid configuration")
         return
 
-    loop = asyncio.get_event_loop()
-    chat_history = []
+    loop = asyncio.get_running_loop()
+    session_id = uuid4().hex
+    memory = ConversationMemory(
+        token_budget=app_config.MEMORY_TOKEN_BUDGET,
+        keep_recent_turns=app_config.MEMORY_KEEP_RECENT_TURNS,
+        summarize=lambda summary, turns: llm.summarize_conversation(summary, turns, GEMINI_API_KEY, persona),
+    )
+    sessions[session_id] = memory
+    # Starts Gemini on a stable partial transcript, before AssemblyAI ends the turn
+    speculator = SpeculativeTurns(
+        lambda query: llm.LLMStream(query, memory.history(), GEMINI_API_KEY, persona),
+        stable_for=app_config.SPECULATION_STABLE_MS / 1000,
+        match_ratio=app_config.SPECULATION_MATCH_RATIO,
+    )
+    speculators[session_id] = speculator
+    downlink_meter = downlink.DownlinkMeter(downlink_format)
+    downlink_meters[session_id] = downlink_meter
+    turn_ids = itertools.count(1)
+    # The assistant turn currently generating or sending audio, cancelled on barge-in
+    current_turn: Optional[asyncio.Task] = None
+    # (turn id, sentences of it the client has finished playing), from its "played" and "interrupt" messages
+    played = [0, 0]
+
+    async def send_frame(message):
+        if isinstance(message, bytes):
+            downlink_meter.add_wire(len(message))
+            await websocket.send_bytes(message)
+        else:
+            text = json.dumps(message)
+            downlink_meter.add_wire(len(text))
+            await websocket.send_text(text)
+
+    def skill_for(text_lower: str) -> str:
+        if any(keyword in text_lower for keyword in WEATHER_KEYWORDS) and WEATHER_API_KEY:
+            return "weather"
+        if ("search for" in text_lower or "what is" in text_lower) and SERPAPI_API_KEY:
+            return "web"
+        return "llm"
 
-    async def handle_transcript(text: str):
+    async def handle_transcript(text: str, previous: Optional[asyncio.Task] = None):
+        if previous is not None:
+            # Let an interrupted turn record what was spoken before reading the history
+            await asyncio.wait([previous])
+        turn_id = next(turn_ids)
         await websocket.send_json({"type": "final", "text": text})
-        
+
+        llm_stream = None
         full_response = ""
-        updated_history = list(chat_history) # Make a copy to avoid modifying in place
 
         # --- Weather Skill Logic ---
-        weather_keywords = ["weather", "mausam", "temperature", "tapman"]
         text_lower = text.lower()
-        if any(keyword in text_lower for keyword in weather_keywords) and WEATHER_API_KEY:
+        skill = skill_for(text_lower)
+        if skill != "llm":
+            # Answered by a skill, so a speculative plain-LLM reply is of no use
+            speculator.cancel()
+        if skill == "weather":
             # Simple city extraction logic
             city = "current location" # Default
             words = text_lower.split()
             if "in" in words:
                 city = text_lower.split(" in ")[-1].strip()
-            elif len(words) > 1 and words[-1] not in weather_keywords:
+            elif len(words) > 1 and words[-1] not in WEATHER_KEYWORDS:
                  city = words[-1].strip()
 
             logging.info(f"Weather skill triggered for city: {city}")
-            full_response = weather.get_weather(city, WEATHER_API_KEY)
-            updated_history.append({"role": "user", "content": text})
-            updated_history.append({"role": "assistant", "content": full_response})
-        
-        # --- LLM Logic ---
-        else:
+            full_response = await loop.run_in_executor(None, weather.get_weather, city, WEATHER_API_KEY)
+
+        # --- Web Search Logic ---
+        elif skill == "web":
             try:
-                if ("search for" in text_lower or "what is" in text_lower) and SERPAPI_API_KEY:
-                    full_response, updated_history = llm.get_web_response(text, chat_history, GEMINI_API_KEY, SERPAPI_API_KEY, persona)
+                web_prompt = await llm.build_web_prompt_async(text, SERPAPI_API_KEY)
+                if web_prompt:
+                    llm_stream = llm.LLMStream(web_prompt, memory.history(), GEMINI_API_KEY, persona)
                 else:
-                    full_response, updated_history = llm.get_llm_response(text, chat_history, GEMINI_API_KEY, persona)
+                    full_response = "I couldn't find any relevant information on the web for that."
             except Exception as e:
-                logging.error(f"Error in LLM pipeline: {e}")
-                await websocket.send_json({"type": "error", "text": "Sorry, an error occurred with the AI response."})
-                return
+                logging.error(f"Error during web search: {e}")
+                full_response = "I'm sorry, I encountered an error while searching the web."
+
+        # --- LLM Logic ---
+        else:
+            # Reuse the reply speculatively started on the partial transcript when it still fits
+            llm_stream = speculator.claim(text) or llm.LLMStream(text, memory.history(), GEMINI_API_KEY, persona)
+
+        async def reply_text():
+            """Yields the reply while Gemini generates it, then shows it in the chat."""
+            if llm_stream is None:
+                yield full_response
+                response_text = full_response
+            else:
+                async for piece in llm_stream:
+                    yield piece
+                response_text = llm_stream.text
+
+            await websocket.send_json({"type": "assistant", "text": response_text})
+
+        framer = protocol.AudioFramer(turn_id, wire_protocol, downlink_format.protocol_codec)
+        # (index, sentence) of each sentence whose audio reached the client in full
+        spoken = []
 
-        chat_history.clear()
-        chat_history.extend(updated_history)
-        await websocket.send_json({"type": "assistant", "text": full_response})
+        async def send_audio(index: int, audio_chunk: bytes):
+            await send_frame(framer.chunk(index, audio_chunk))
 
-        # --- TTS Logic ---
+        async def send_sentence_end(index: int, sentence: str):
+            await send_frame(framer.end(index))
+            spoken.append((index, sentence))
+
+        def heard() -> List[str]:
+            # Sent is not heard: the client may still have had sentences queued for playback
+            played_count = played[1] if played[0] == turn_id else 0
+            return [sentence for index, sentence in spoken if not reports_playback or index < played_count]
+
+        def record_turn(interrupted: bool):
+            user_content = {"role": "user", "parts": [text]}
+            if interrupted:
+                # Only what the user actually heard goes into the history
+                if heard_text := " ".join(heard()):
+                    memory.add_turn(user_content, {"role": "model", "parts": [heard_text]})
+            elif llm_stream is None:
+                memory.add_turn(user_content, {"role": "model", "parts": [full_response]})
+            elif llm_stream.completed:
+                # Store what the user said rather than the search-augmented prompt
+                memory.add_turn(user_content, llm_stream.history[-1])
+
+        # --- LLM -> TTS Pipeline ---
+        # Sentence N is synthesized while sentence N+1 is still being generated
         try:
-            sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
-            for sentence in sentences:
-                if sentence.strip():
-                    audio_bytes = await loop.run_in_executor(None, tts.speak, sentence.strip(), MURF_API_KEY)
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            await pipeline.run_turn_pipeline(
+                reply_text(),
+                lambda sentence: downlink.encode(
+                    tts.stream_speech(
+                        sentence,
+                        MURF_API_KEY,
+                        audio_format=downlink_format.murf_format,
+                        sample_rate=downlink_format.sample_rate,
+                    ),
+                    downlink_format,
+                    downlink_meter,
+                ),
+                send_audio,
+                send_sentence_end,
+            )
+            record_turn(interrupted=False)
+        except asyncio.CancelledError:
+            # Barge-in: Gemini, Murf and queued frames were torn down with the pipeline
+            record_turn(interrupted=True)
+            logging.info(f"Turn {turn_id} interrupted after {len(heard())} of {len(spoken)} sentence(s) sent")
+            try:
+                await websocket.send_json({"type": "interrupted", "turn": turn_id, "text": " ".join(heard())})
+            except Exception:
+                pass
+            raise
         except Exception as e:
-            logging.error(f"Error in TTS pipeline: {e}")
+            record_turn(interrupted=True)
+            logging.error(f"Error in LLM/TTS pipeline: {e}")
+            await websocket.send_json({"type": "error", "text": "Sorry, an error occurred with the AI response."})
+
+    def interrupt(reason: str) -> bool:
+        """Cancels the running assistant turn, if any."""
+        if current_turn is None or current_turn.done():
+            return False
+        logging.info(f"Barge-in ({reason}): cancelling the current turn")
+        current_turn.cancel()
+        return True
+
+    def start_turn(text: str):
+        nonlocal current_turn
+        # A new final transcript supersedes whatever the assistant is still saying
+        previous = current_turn if interrupt("new turn") else None
+        current_turn = asyncio.create_task(handle_transcript(text, previous))
 
+    def handle_partial(text: str):
+        if app_config.BARGE_IN_ENABLED and len(text.split()) >= app_config.BARGE_IN_MIN_WORDS:
+            interrupt("speech")
+        # Only speculate while the assistant is idle, so the history it reads is settled
+        if speculate and (current_turn is None or current_turn.done()) and skill_for(text.lower()) == "llm":
+            speculator.on_partial(text)
+
+    def on_partial_transcript(text: str):
+        loop.call_soon_threadsafe(handle_partial, text)
 
     def on_final_transcript(text: str):
         logging.info(f"Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        loop.call_soon_threadsafe(start_turn, text)
 
-    app_config.ASSEMBLYAI_API_KEY = ASSEMBLYAI_API_KEY
-    
-    transcriber = stt.AssemblyAIStreamingTranscriber(
-        on_final_callback=on_final_transcript
+    # Browser frames are re-chunked to the size AssemblyAI handles best
+    reframer = PcmReframer(
+        chunk_ms=app_config.STT_CHUNK_MS,
+        max_hold_ms=app_config.STT_MAX_HOLD_MS,
     )
+    reframers[session_id] = reframer
+
+    async def end_of_speech():
+        # Send the tail of the utterance before closing the turn
+        tail = reframer.flush()
+        if tail:
+            await stt_sender.send(tail)
+        if app_config.VAD_FORCE_ENDPOINT:
+            stt_sender.send_control(transcriber.force_endpoint)
+
+    gate = None
+    if app_config.VAD_ENABLED:
+        gate = VoiceActivityGate(
+            frame_ms=app_config.VAD_FRAME_MS,
+            preroll_ms=app_config.VAD_PREROLL_MS,
+            hangover_ms=app_config.VAD_HANGOVER_MS,
+            speech_start_ms=app_config.VAD_SPEECH_START_MS,
+            keepalive_ms=app_config.VAD_KEEPALIVE_MS,
+            keepalive_chunk_ms=app_config.VAD_KEEPALIVE_CHUNK_MS,
+            model=EnergyZcrModel(min_rms=app_config.VAD_MIN_RMS, max_zcr=app_config.VAD_MAX_ZCR),
+        )
+        vad_gates[session_id] = gate
+
+    async def flush_held_audio():
+        """Sends a partial chunk that has waited too long, e.g. after a late or short frame."""
+        while True:
+            await asyncio.sleep(app_config.STT_MAX_HOLD_MS / 2000)
+            tail = reframer.flush_stale()
+            if tail:
+                stt_sender.send_nowait(tail)
 
+    async def handle_pcm(pcm: bytes):
+        # Silence never leaves the server unless it pads real speech
+        frames, speech_ended = gate.process(pcm) if gate else ([pcm], False)
+        for frame in frames:
+            for chunk in reframer.push(frame):
+                await stt_sender.send(chunk)
+        # Only after the hangover frames above are queued
+        if speech_ended:
+            await end_of_speech()
+
+    stt_session = None
+    stt_sender = None
+    flusher = None
+    decoder = None
     try:
+        try:
+            # A pre-warmed AssemblyAI session skips the streaming handshake
+            stt_session = await stt_pool.acquire(ASSEMBLYAI_API_KEY)
+        except Exception as e:
+            logging.error(f"Could not open an AssemblyAI streaming session: {e}")
+            await websocket.close(code=1011, reason="Transcription service unavailable")
+            return
+
+        transcriber = stt.AssemblyAIStreamingTranscriber(
+            on_partial_callback=on_partial_transcript,
+            on_final_callback=on_final_transcript,
+            session=stt_session,
+        )
+
+        # The SDK send runs on a worker thread so a slow network never stalls this loop
+        stt_sender = STTSender(
+            transcriber.stream_audio,
+            max_queued=app_config.STT_SEND_QUEUE_CHUNKS,
+            policy=app_config.STT_OVERFLOW_POLICY,
+        )
+        stt_senders[session_id] = stt_sender
+
+        flusher = asyncio.create_task(flush_held_audio())
+
+        # Compressed microphone audio is decoded back to the PCM AssemblyAI expects
+        decoder = uplink.create_decoder(uplink_codec, handle_pcm)
+        if decoder:
+            try:
+                await decoder.start()
+                uplink_decoders[session_id] = decoder
+            except Exception as e:
+                logging.error(f"Could not start the {uplink_codec} uplink decoder, falling back to PCM: {e}")
+                decoder = None
+                uplink_codec = uplink.PCM16
+        await websocket.send_json({"type": "uplink", "codec": uplink_codec})
+        await websocket.send_json(downlink_format.describe())
+
         while True:
-            data = await websocket.receive_bytes()
-            transcriber.stream_audio(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                reframer.note_arrival()
+                if decoder:
+                    await decoder.feed(message["bytes"])
+                    if getattr(decoder, "failed", False):
+                        # Nothing more can reach AssemblyAI; let the client reconnect
+                        await websocket.send_json({"type": "error", "text": "Microphone audio could not be decoded."})
+                        await websocket.close(code=1011, reason="Uplink decoder failed")
+                        break
+                else:
+                    await handle_pcm(message["bytes"])
+            elif message.get("text"):
+                # Control messages from the client, e.g. {"type": "interrupt"}
+                try:
+                    control = json.loads(message["text"])
+                    # {"type": "played", "turn": 3, "sentences": 2}: the first two sentences of turn 3 finished playing
+                    turn, sentences = int(control.get("turn", 0)), int(control.get("sentences", 0))
+                except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+                    logging.warning("Ignoring malformed control message")
+                    continue
+                if control.get("type") in ("played", "interrupt") and turn:
+                    if turn > played[0] or (turn == played[0] and sentences > played[1]):
+                        played[:] = [turn, sentences]
+                if control.get("type") == "interrupt":
+                    interrupt("client")
     except WebSocketDisconnect:
         logging.info("Client disconnected.")
     finally:
-        transcriber.close()
-        logging.info("Transcription resources released.")
\ No newline at end of file
+        if flusher:
+            flusher.cancel()
+        interrupt("disconnect")
+        if decoder:
+            await decoder.close()
+        if stt_sender:
+            await stt_sender.close()
+        # Closed here whatever failed after it was acquired, so no AssemblyAI session leaks
+        if stt_session:
+            await loop.run_in_executor(None, stt_session.close)
+        memory.close()
+        speculator.cancel()
+        sessions.pop(session_id, None)
+        speculators.pop(session_id, None)
+        vad_gates.pop(session_id, None)
+        reframers.pop(session_id, None)
+        stt_senders.pop(session_id, None)
+        uplink_decoders.pop(session_id, None)
+        downlink_meters.pop(session_id, None)
+        logging.info(
+            f"Transcription resources released. Session stats: {memory.stats()}, "
+            f"speculation: {speculator.stats()}, vad: {gate.stats() if gate else None}, "
+            f"framing: {reframer.stats()}, stt send: {stt_sender.stats() if stt_sender else None}, "
+            f"uplink: {decoder.stats() if decoder else uplink_codec}, downlink: {downlink_meter.stats()}"
+        )
\ No newline at end of file
@@ -0,0 +1,50 @@
+# benchmarks/bench_model_setup.py
+"""
+Per-turn Gemini setup overhead: build a model and its key's client every turn
+vs. the keyed model registry. No requests are sent. Run from day-27:
+
+    python -m benchmarks.bench_model_setup
+"""
+import argparse
+import time
+
+from services.llm import GeminiModel, ModelRegistry, system_prompts
+
+HISTORY = [{"role": "user", "parts": ["Hi"]}, {"role": "model", "parts": ["Hello!"]}]
+
+
+def rebuild_per_turn(api_key: str, persona: str):
+    model = GeminiModel(api_key, 'gemini-1.5-flash', system_instruction=system_prompts[persona])
+    # Clients are created lazily on first use; force it like a real turn would
+    model.client
+    return model.request(HISTORY)
+
+
+def from_registry(registry: ModelRegistry, api_key: str, persona: str):
+    model = registry.get(api_key, persona)
+    model.client
+    return model.request(HISTORY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=4, help="distinct API keys taking turns")
+    args = parser.parse_args()
+
+    keys = [f"fake-key-{i}" for i in range(args.keys)]
+    registry = ModelRegistry()
+
+    for name, setup in (
+        ("rebuild per turn", rebuild_per_turn),
+        ("model registry", lambda key, persona: from_registry(registry, key, persona)),
+    ):
+        start = time.perf_counter()
+        for turn in range(args.turns):
+            setup(keys[turn % len(keys)], "zarex")
+        per_turn = (time.perf_counter() - start) / args.turns
+        print(f"{name:>17}: {1e6 * per_turn:9.1f} us per turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_pipeline.py
+"""
+Time to first audio: serial LLM-then-TTS path vs. the pipelined turn.
+
+Gemini and Murf are replaced by fakes with configurable latencies so the
+numbers isolate the scheduling difference. Run from day-27:
+
+    python -m benchmarks.bench_pipeline
+"""
+import argparse
+import asyncio
+import re
+import time
+
+from services.pipeline import run_turn_pipeline
+
+REPLY = (
+    "Sure, here is a quick plan. First, warm up for five minutes. "
+    "Then do three rounds of squats and push-ups. "
+    "Rest for a minute between rounds. "
+    "Finish with some light stretching. "
+    "Drink water and you are done!"
+)
+
+
+async def fake_llm(tokens_per_second: float):
+    for token in re.findall(r"\S+\s*", REPLY):
+        await asyncio.sleep(1 / tokens_per_second)
+        yield token
+
+
+async def fake_tts(sentence: str, first_chunk_delay: float, chunks: int = 4):
+    await asyncio.sleep(first_chunk_delay)
+    for _ in range(chunks):
+        yield b"\0" * 4096
+        await asyncio.sleep(first_chunk_delay / 4)
+
+
+async def serial(args) -> float:
+    start = time.perf_counter()
+    full_response = "".join([piece async for piece in fake_llm(args.tokens_per_second)])
+    for sentence in re.split(r'(?<=[.?!])\s+', full_response.strip()):
+        async for _ in fake_tts(sentence, args.tts_latency):
+            return time.perf_counter() - start
+
+
+async def pipelined(args) -> float:
+    start = time.perf_counter()
+    first_audio = None
+
+    async def on_audio(index, chunk):
+        nonlocal first_audio
+        if first_audio is None:
+            first_audio = time.perf_counter() - start
+
+    await run_turn_pipeline(
+        fake_llm(args.tokens_per_second),
+        lambda sentence: fake_tts(sentence, args.tts_latency),
+        on_audio,
+    )
+    return first_audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--tts-latency", type=float, default=0.25, help="seconds until Murf's first chunk")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, path in (("serial", serial), ("pipelined", pipelined)):
+        samples = [asyncio.run(path(args)) for _ in range(args.runs)]
+        print(f"{name:>10}: time to first audio {1000 * sum(samples) / len(samples):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_stt_startup.py
+"""
+Startup to first partial transcript: connecting per /ws session vs. the pre-warmed pool.
+
+A local fake AssemblyAI streaming server (real WebSocket handshake, Begin /
+Turn / Termination messages) adds a configurable handshake delay, so the
+numbers isolate what the pool takes off the critical path. Run from day-27:
+
+    python -m benchmarks.bench_stt_startup
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from services.stt import AssemblyAIStreamingTranscriber, open_session
+from services.stt_pool import STTSessionPool
+
+AUDIO_50MS = b"\0" * 1600
+
+
+def fake_assemblyai(handshake_delay: float, partial_delay: float):
+    async def process_request(connection, request):
+        # TLS, auth and session setup on the real service
+        await asyncio.sleep(handshake_delay)
+        return None
+
+    async def handler(ws):
+        expires = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+        await ws.send(json.dumps({"type": "Begin", "id": "bench", "expires_at": expires}))
+        partial_sent = False
+        async for message in ws:
+            if isinstance(message, bytes):
+                if not partial_sent:
+                    partial_sent = True
+                    await asyncio.sleep(partial_delay)
+                    await ws.send(json.dumps({
+                        "type": "Turn", "turn_order": 0, "turn_is_formatted": False, "end_of_turn": False,
+                        "transcript": "hello", "end_of_turn_confidence": 0.1, "words": [],
+                    }))
+            elif json.loads(message).get("type") == "Terminate":
+                try:
+                    await ws.send(json.dumps({"type": "Termination", "audio_duration_seconds": 0}))
+                except ConnectionClosed:
+                    pass
+                return
+
+    return handler, process_request
+
+
+async def first_partial(get_session) -> float:
+    """Seconds from the browser socket being accepted to the first partial transcript."""
+    loop = asyncio.get_running_loop()
+    got_partial = threading.Event()
+    start = time.perf_counter()
+    session = await get_session()
+    transcriber = AssemblyAIStreamingTranscriber(
+        on_partial_callback=lambda text: got_partial.set(),
+        session=session,
+    )
+    transcriber.stream_audio(AUDIO_50MS)
+    await loop.run_in_executor(None, got_partial.wait, 10)
+    elapsed = time.perf_counter() - start
+    await loop.run_in_executor(None, transcriber.close)
+    return elapsed
+
+
+async def bench(args):
+    handler, process_request = fake_assemblyai(args.handshake_delay, args.partial_delay)
+    async with serve(handler, "127.0.0.1", 0, process_request=process_request) as server:
+        host = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        loop = asyncio.get_running_loop()
+
+        def connect(api_key, sample_rate):
+            return open_session(api_key, sample_rate, host)
+
+        async def cold():
+            return await loop.run_in_executor(None, connect, "bench-key", 16000)
+
+        pool = STTSessionPool(size_per_key=1, connect=connect)
+
+        async def warm():
+            return await pool.acquire("bench-key", 16000)
+
+        pool.warm("bench-key", 16000, keep_warm=True)
+        results = {"per-session connect": [], "pre-warmed pool": []}
+        for _ in range(args.runs):
+            results["per-session connect"].append(await first_partial(cold))
+            # Give the background refill time to land, as it would between real visitors
+            await asyncio.sleep(args.handshake_delay * 2 + 0.2)
+            results["pre-warmed pool"].append(await first_partial(warm))
+        # Let the last refill finish before the fake server goes away
+        await asyncio.sleep(args.handshake_delay * 2 + 0.2)
+        for name, samples in results.items():
+            print(f"{name:>20}: startup to first partial {1000 * sum(samples) / len(samples):7.1f} ms")
+        print(f"{'pool':>20}: {pool.stats()}")
+        await loop.run_in_executor(None, pool.close)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--handshake-delay", type=float, default=0.3, help="seconds for the streaming handshake")
+    parser.add_argument("--partial-delay", type=float, default=0.15, help="seconds from audio to first partial")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
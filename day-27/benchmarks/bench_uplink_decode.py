@@ -0,0 +1,132 @@
+# benchmarks/bench_uplink_decode.py
+"""
+Server CPU spent decoding compressed microphone uplink, per session.
+
+Encodes a synthetic voice-like clip to WebM/Opus with ffmpeg (and to raw
+Opus packets when opuslib is installed), then decodes it with N concurrent
+session decoders exactly as /ws does. Reports CPU time per minute of audio,
+the real-time factor, and uplink bytes versus raw 16 kHz PCM. Run from day-27:
+
+    python -m benchmarks.bench_uplink_decode --sessions 10
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from services import uplink
+
+SAMPLE_RATE = 16000
+PCM_BYTES_PER_SECOND = SAMPLE_RATE * 2
+# MediaRecorder timeslice: the browser sends one WebM chunk per 100 ms
+CHUNK_MS = 100
+
+
+def voice_like_pcm(seconds: float) -> bytes:
+    """A 120-220 Hz gliding tone with harmonics and syllable-rate amplitude changes."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 170 + 50 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t).clip(0)
+    return (signal * envelope * 6000).astype("<i2").tobytes()
+
+
+def encode_webm(pcm: bytes, bitrate: int) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "clip.webm")
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+             "-c:a", "libopus", "-b:a", str(bitrate), "-frame_duration", "20", out],
+            input=pcm, check=True,
+        )
+        with open(out, "rb") as f:
+            return f.read()
+
+
+def encode_opus_packets(pcm: bytes, bitrate: int):
+    encoder = uplink.opuslib.Encoder(SAMPLE_RATE, 1, "voip")
+    encoder.bitrate = bitrate
+    frame_bytes = SAMPLE_RATE // 50 * 2  # 20 ms
+    return [encoder.encode(pcm[i:i + frame_bytes], frame_bytes // 2) for i in range(0, len(pcm) - frame_bytes + 1, frame_bytes)]
+
+
+async def decode_session(codec: str, messages, realtime: bool) -> int:
+    decoded = 0
+
+    async def on_pcm(pcm: bytes):
+        nonlocal decoded
+        decoded += len(pcm)
+
+    decoder = uplink.create_decoder(codec, on_pcm, SAMPLE_RATE)
+    await decoder.start()
+    interval = CHUNK_MS / 1000 if codec == uplink.WEBM_OPUS else 0.02
+    for message in messages:
+        await decoder.feed(message)
+        if realtime:
+            await asyncio.sleep(interval)
+    await decoder.close(drain_timeout=10)
+    return decoded
+
+
+def run(codec: str, messages, sessions: int, realtime: bool):
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    async def all_sessions():
+        return await asyncio.gather(*(decode_session(codec, messages, realtime) for _ in range(sessions)))
+
+    decoded = asyncio.run(all_sessions())
+    wall = time.perf_counter() - start
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    child_cpu = (children_after.ru_utime + children_after.ru_stime) - (children_before.ru_utime + children_before.ru_stime)
+    self_cpu = (self_after.ru_utime + self_after.ru_stime) - (self_before.ru_utime + self_before.ru_stime)
+    return decoded, wall, child_cpu, self_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=30, help="length of the test clip")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions decoding the clip")
+    parser.add_argument("--bitrate", type=int, default=24000, help="Opus bitrate in bits per second")
+    parser.add_argument("--realtime", action="store_true", help="pace input like a live microphone instead of as fast as possible")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        raise SystemExit("ffmpeg is required on the PATH to encode the test clip")
+
+    pcm = voice_like_pcm(args.seconds)
+    webm = encode_webm(pcm, args.bitrate)
+    chunk = max(1, len(webm) * CHUNK_MS // int(args.seconds * 1000))
+    cases = [(uplink.WEBM_OPUS, [webm[i:i + chunk] for i in range(0, len(webm), chunk)])]
+    if uplink.opuslib is not None:
+        cases.append((uplink.OPUS, encode_opus_packets(pcm, args.bitrate)))
+    else:
+        print("opuslib not installed; skipping raw Opus packets")
+
+    print(f"{args.seconds:.0f} s clip, {args.sessions} sessions, raw PCM {PCM_BYTES_PER_SECOND * 8 / 1000:.0f} kbps")
+    for codec, messages in cases:
+        wire = sum(len(m) for m in messages)
+        decoded, wall, child_cpu, self_cpu = run(codec, messages, args.sessions, args.realtime)
+        audio_minutes = args.sessions * args.seconds / 60
+        cpu = child_cpu + self_cpu
+        print(
+            f"{codec:>10}: {wire * 8 / args.seconds / 1000:5.1f} kbps uplink ({len(pcm) / wire:4.1f}x smaller), "
+            f"{cpu / audio_minutes:6.2f} CPU s per audio minute per session "
+            f"(decoder processes {child_cpu:.2f} s, server {self_cpu:.2f} s), "
+            f"real-time factor {cpu / (args.sessions * args.seconds):.4f}, wall {wall:.2f} s, "
+            f"decoded {sum(decoded) / args.sessions / PCM_BYTES_PER_SECOND:.1f} s per session"
+        )
+
+
+if __name__ == "__main__":
+    main()
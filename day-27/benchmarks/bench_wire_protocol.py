@@ -0,0 +1,68 @@
+# benchmarks/bench_wire_protocol.py
+"""
+Assistant audio on the wire: base64-in-JSON (protocol v0) vs binary frames (v1).
+
+Uses a canned 1500-character reply, sized as 44.1 kHz 16-bit mono WAV at a
+typical speaking rate and split into Murf-sized chunks. Run from day-27:
+
+    python -m benchmarks.bench_wire_protocol
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+from services.protocol import AudioFramer, decode_audio_frame
+
+REPLY_CHARS = 1500
+CHARS_PER_SECOND = 15          # ~180 words per minute
+BYTES_PER_SECOND = 44100 * 2   # 44.1 kHz, 16-bit, mono
+
+
+def canned_chunks(chunk_size: int):
+    audio = os.urandom(int(REPLY_CHARS / CHARS_PER_SECOND * BYTES_PER_SECOND))
+    return [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+
+
+def run(chunks, protocol: int):
+    framer = AudioFramer(turn_id=1, protocol=protocol)
+
+    start = time.perf_counter()
+    messages = [framer.chunk(0, chunk) for chunk in chunks]
+    # Text frames are sent as UTF-8 JSON
+    wire = [m if isinstance(m, bytes) else json.dumps(m).encode("utf-8") for m in messages]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame in wire:
+        if protocol >= 1:
+            decode_audio_frame(frame)
+        else:
+            base64.b64decode(json.loads(frame)["b64"])
+    decode_s = time.perf_counter() - start
+
+    return sum(len(frame) for frame in wire), encode_s, decode_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunk-size", type=int, default=8192, help="bytes of audio per Murf chunk")
+    args = parser.parse_args()
+
+    chunks = canned_chunks(args.chunk_size)
+    audio_bytes = sum(len(c) for c in chunks)
+    print(f"{audio_bytes / 1e6:.2f} MB of audio in {len(chunks)} chunks")
+    for name, version in (("base64 JSON (v0)", 0), ("binary frames (v1)", 1)):
+        wire_bytes, encode_s, decode_s = run(chunks, version)
+        overhead = 100 * (wire_bytes / audio_bytes - 1)
+        throughput = audio_bytes / 1e6 / encode_s
+        print(
+            f"{name:>19}: {wire_bytes / 1e6:6.2f} MB on the wire (+{overhead:4.1f}%), "
+            f"server encode {1000 * encode_s:6.1f} ms ({throughput:7.1f} MB/s), "
+            f"decode {1000 * decode_s:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,77 @@ ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
 
+# Gemini request bounds: per-request timeout (seconds) and threads for blocking search calls
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+LLM_BLOCKING_WORKERS = int(os.getenv("LLM_BLOCKING_WORKERS", "8"))
+# Cached GenerativeModel instances, one per (API key, persona)
+LLM_MODEL_CACHE_SIZE = int(os.getenv("LLM_MODEL_CACHE_SIZE", "64"))
+# Persona prompts at least this many tokens are registered once as Gemini cached content
+LLM_PROMPT_CACHE_MIN_TOKENS = int(os.getenv("LLM_PROMPT_CACHE_MIN_TOKENS", "32768"))
+LLM_PROMPT_CACHE_TTL = float(os.getenv("LLM_PROMPT_CACHE_TTL", "3600"))
+# API keys per persona whose cached-content handles (or failed attempts) are remembered
+LLM_PROMPT_CACHE_MAX_KEYS = int(os.getenv("LLM_PROMPT_CACHE_MAX_KEYS", "256"))
+
+# Conversation memory: estimated tokens of history sent per turn before older turns are summarized
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+MEMORY_KEEP_RECENT_TURNS = int(os.getenv("MEMORY_KEEP_RECENT_TURNS", "4"))
+
+# Murf TTS connection pool tuning (shared by every WebSocket session)
+TTS_POOL_MAX_CONNECTIONS = int(os.getenv("TTS_POOL_MAX_CONNECTIONS", "10"))
+TTS_POOL_MAX_KEEPALIVE = int(os.getenv("TTS_POOL_MAX_KEEPALIVE", "5"))
+TTS_POOL_IDLE_TIMEOUT = float(os.getenv("TTS_POOL_IDLE_TIMEOUT", "60"))
+# Sentences synthesized concurrently per Murf API key (keep under Murf rate limits)
+TTS_MAX_CONCURRENCY_PER_KEY = int(os.getenv("TTS_MAX_CONCURRENCY_PER_KEY", "3"))
+
+# Synthesized audio cache (in-memory LRU in front of an on-disk store, default uploads/tts_cache)
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR")
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+# Barge-in: a partial transcript of at least this many words cancels the assistant's running turn
+BARGE_IN_ENABLED = os.getenv("BARGE_IN_ENABLED", "true").lower() == "true"
+BARGE_IN_MIN_WORDS = int(os.getenv("BARGE_IN_MIN_WORDS", "2"))
+
+# Speculative LLM start: a partial transcript unchanged for SPECULATION_STABLE_MS starts Gemini early;
+# the reply is kept if the final transcript matches it by at least SPECULATION_MATCH_RATIO
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "false").lower() == "true"
+SPECULATION_STABLE_MS = float(os.getenv("SPECULATION_STABLE_MS", "400"))
+SPECULATION_MATCH_RATIO = float(os.getenv("SPECULATION_MATCH_RATIO", "0.9"))
+
+# Voice activity gate in front of AssemblyAI: silence is dropped apart from pre-roll, hangover and keepalive
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "20"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "700"))
+VAD_SPEECH_START_MS = int(os.getenv("VAD_SPEECH_START_MS", "60"))
+VAD_KEEPALIVE_MS = int(os.getenv("VAD_KEEPALIVE_MS", "5000"))
+VAD_KEEPALIVE_CHUNK_MS = int(os.getenv("VAD_KEEPALIVE_CHUNK_MS", "50"))
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "300"))
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.35"))
+# Ask AssemblyAI to close the turn as soon as the hangover expires
+VAD_FORCE_ENDPOINT = os.getenv("VAD_FORCE_ENDPOINT", "true").lower() == "true"
+
+# PCM sent to AssemblyAI is re-chunked to STT_CHUNK_MS (50 for latency, up to 200 for throughput);
+# a partial chunk is sent anyway after STT_MAX_HOLD_MS, padded with silence to the 50 ms v3 minimum
+STT_CHUNK_MS = int(os.getenv("STT_CHUNK_MS", "50"))
+STT_MAX_HOLD_MS = int(os.getenv("STT_MAX_HOLD_MS", "100"))
+
+# Chunks waiting for the AssemblyAI send worker, and what to do when that queue is full:
+# "drop_oldest" keeps latency bounded, "backpressure" stops reading from the client until there is room
+STT_SEND_QUEUE_CHUNKS = int(os.getenv("STT_SEND_QUEUE_CHUNKS", "50"))
+STT_OVERFLOW_POLICY = os.getenv("STT_OVERFLOW_POLICY", "drop_oldest")
+# Threads shared by every session for the blocking AssemblyAI sends (each session keeps one in flight)
+STT_SEND_WORKERS = int(os.getenv("STT_SEND_WORKERS", "8"))
+
+# Pre-connected AssemblyAI streaming sessions kept per (API key, sample rate); 0 disables pre-warming.
+# Idle sessions are closed after STT_POOL_IDLE_TTL seconds, since an open session is billed time
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "1"))
+STT_POOL_IDLE_TTL = float(os.getenv("STT_POOL_IDLE_TTL", "60"))
+# Opt-in: AssemblyAI keys that /ws clients are known to send (e.g. a team's shared key), kept warm at all times.
+# The server's own ASSEMBLYAI_API_KEY is never used by /ws, so it doesn't belong here unless clients send it too
+STT_POOL_KEEP_WARM_KEYS = [key.strip() for key in os.getenv("STT_POOL_KEEP_WARM_KEYS", "").split(",") if key.strip()]
+
 # Configure APIs and log warnings if keys are missing
 if ASSEMBLYAI_API_KEY:
     aai.settings.api_key = ASSEMBLYAI_API_KEY
@@ -29,4 +100,14 @@ if not MURF_API_KEY:
     logging.warning("MURF_API_KEY not found in .env file.")
 
 if not SERPAPI_API_KEY:
-    logging.warning("SERPAPI_API_KEY not found in .env file.")
\ No newline at end of file
+    logging.warning("SERPAPI_API_KEY not found in .env file.")
+
+# Microphone uplink formats the server will negotiate, in addition to raw PCM: "webm-opus" needs ffmpeg
+# on the PATH, "opus" (raw packets) needs opuslib. Compressed uplink is roughly 10x smaller than PCM
+UPLINK_CODECS = [codec.strip() for codec in os.getenv("UPLINK_CODECS", "webm-opus,opus,pcm16").split(",") if codec.strip()]
+
+# Assistant audio formats the server will negotiate with clients that advertise them ("opus" needs ffmpeg),
+# the sample rate Murf renders them at, and the Opus bitrate. Other clients keep receiving 44.1 kHz WAV
+DOWNLINK_CODECS = [codec.strip() for codec in os.getenv("DOWNLINK_CODECS", "opus,mp3,pcm16,wav").split(",") if codec.strip()]
+DOWNLINK_SAMPLE_RATE = int(os.getenv("DOWNLINK_SAMPLE_RATE", "24000"))
+DOWNLINK_OPUS_BITRATE = int(os.getenv("DOWNLINK_OPUS_BITRATE", "32000"))
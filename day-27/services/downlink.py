@@ -0,0 +1,260 @@
+# services/downlink.py
+import asyncio
+import logging
+import shutil
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from services import protocol
+
+logger = logging.getLogger(__name__)
+
+# Assistant audio formats a client can accept, announced in its config message as
+# {"downlink": {"codecs": ["opus", "mp3", "pcm16", "wav"], "sample_rate": 24000}}
+WAV = "wav"        # 44.1 kHz WAV straight from Murf, what every client played before
+PCM16 = "pcm16"    # headerless 16-bit mono PCM from Murf at the negotiated rate
+MP3 = "mp3"        # MP3 straight from Murf, played through Media Source Extensions
+OPUS = "opus"      # Murf WAV transcoded by ffmpeg to Opus in WebM, played through MSE
+
+LEGACY_SAMPLE_RATE = 44100
+MURF_SAMPLE_RATES = (8000, 16000, 24000, 44100, 48000)
+PIPE_READ_BYTES = 4096
+WAV_HEADER_BYTES = 44
+
+# MPEG audio Layer III tables, keyed by the header's version field (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+@dataclass(frozen=True)
+class DownlinkFormat:
+    codec: str
+    sample_rate: int
+    protocol_codec: int
+    murf_format: str
+    mime: Optional[str] = None
+    transcode: bool = False
+    bitrate: int = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": "downlink", "codec": self.codec, "sample_rate": self.sample_rate, "mime": self.mime}
+
+
+def _format_for(codec: str, sample_rate: int, opus_bitrate: int = 32000) -> DownlinkFormat:
+    if codec == OPUS:
+        return DownlinkFormat(OPUS, sample_rate, protocol.CODEC_OPUS, "WAV", 'audio/webm; codecs="opus"', True, opus_bitrate)
+    if codec == MP3:
+        return DownlinkFormat(MP3, sample_rate, protocol.CODEC_MP3, "MP3", "audio/mpeg")
+    if codec == PCM16:
+        return DownlinkFormat(PCM16, sample_rate, protocol.CODEC_PCM16, "PCM")
+    return DownlinkFormat(WAV, LEGACY_SAMPLE_RATE, protocol.CODEC_WAV, "WAV")
+
+
+LEGACY = _format_for(WAV, LEGACY_SAMPLE_RATE)
+
+
+def negotiate(
+    offered: Any,
+    wire_protocol: int,
+    enabled: List[str],
+    default_sample_rate: int = 24000,
+    opus_bitrate: int = 32000,
+) -> DownlinkFormat:
+    """
+    Picks the client's most preferred codec the server can produce.
+
+    Only binary-frame (v1) clients can tell codecs apart, so older clients,
+    and clients that don't advertise anything, keep getting 44.1 kHz WAV.
+    """
+    if wire_protocol < 1 or not isinstance(offered, dict):
+        return LEGACY
+    sample_rate = int(offered.get("sample_rate") or default_sample_rate)
+    if sample_rate not in MURF_SAMPLE_RATES:
+        sample_rate = default_sample_rate
+    usable = {WAV: True, PCM16: True, MP3: True, OPUS: shutil.which("ffmpeg") is not None}
+    for codec in offered.get("codecs") or []:
+        if codec in enabled and usable.get(codec):
+            return _format_for(codec, sample_rate, opus_bitrate)
+    return LEGACY
+
+
+def murf_outputs(enabled: List[str], default_sample_rate: int = 24000) -> List[Tuple[str, int]]:
+    """
+    Every (Murf format, sample rate) a session can ask Murf for when it takes
+    the default sample rate, legacy 44.1 kHz WAV included. These are the
+    variants worth pre-synthesizing into the audio cache.
+    """
+    outputs = [(LEGACY.murf_format, LEGACY.sample_rate)]
+    for codec in enabled:
+        if codec == OPUS and shutil.which("ffmpeg") is None:
+            continue
+        fmt = _format_for(codec, default_sample_rate)
+        if (fmt.murf_format, fmt.sample_rate) not in outputs:
+            outputs.append((fmt.murf_format, fmt.sample_rate))
+    return outputs
+
+
+def _mp3_frame(data: bytes, i: int) -> Optional[Tuple[int, int, int]]:
+    """(frame length, samples, sample rate) of an MPEG Layer III frame header at `data[i]`, if there is one."""
+    b1, b2 = data[i + 1], data[i + 2]
+    if data[i] != 0xFF or b1 & 0xE0 != 0xE0 or (b1 >> 1) & 0x03 != 0x01:
+        return None
+    version = (b1 >> 3) & 0x03
+    bitrate_index, rate_index, padding = b2 >> 4, (b2 >> 2) & 0x03, (b2 >> 1) & 0x01
+    if version == 1 or not 0 < bitrate_index < 15 or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+    rate = _MP3_SAMPLE_RATES[version][rate_index]
+    samples = 1152 if version == 3 else 576
+    return samples // 8 * bitrate // rate + padding, samples, rate
+
+
+class Mp3Duration:
+    """Adds up the playing time of MP3 frames as they stream past, holding only a few bytes between chunks."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._pending = b""
+        self._skip = 0
+
+    def feed(self, chunk: bytes):
+        data = self._pending + chunk
+        i = min(self._skip, len(data))
+        self._skip -= i
+        while i + 10 <= len(data):
+            if data[i:i + 3] == b"ID3":
+                # ID3v2 tag; its size is a 28-bit syncsafe integer
+                advance = 10 + ((data[i + 6] & 0x7F) << 21 | (data[i + 7] & 0x7F) << 14 | (data[i + 8] & 0x7F) << 7 | (data[i + 9] & 0x7F))
+            else:
+                frame = _mp3_frame(data, i)
+                if frame is None:
+                    i += 1
+                    continue
+                advance, samples, rate = frame
+                self.seconds += samples / rate
+            if i + advance > len(data):
+                self._skip = i + advance - len(data)
+                i = len(data)
+                break
+            i += advance
+        self._pending = data[i:]
+
+
+class DownlinkMeter:
+    """Counts one session's assistant audio on the wire against how long that audio plays."""
+
+    def __init__(self, fmt: DownlinkFormat):
+        self.format = fmt
+        self.started_at = time.monotonic()
+        self.wire_bytes = 0
+        self.audio_seconds = 0.0
+
+    def add_wire(self, size: int):
+        self.wire_bytes += size
+        totals[self.format.codec]["wire_bytes"] += size
+
+    def add_audio(self, seconds: float):
+        self.audio_seconds += seconds
+        totals[self.format.codec]["audio_seconds"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "codec": self.format.codec,
+            "sample_rate": self.format.sample_rate,
+            **_rates(self.wire_bytes, self.audio_seconds),
+            "bytes_per_session_minute": round(self.wire_bytes * 60 / max(time.monotonic() - self.started_at, 1e-3)),
+        }
+
+
+# Process-wide downlink volume per codec, for /metrics
+totals: Dict[str, Dict[str, float]] = defaultdict(lambda: {"wire_bytes": 0, "audio_seconds": 0.0})
+
+
+def _rates(wire_bytes: int, audio_seconds: float) -> Dict[str, Any]:
+    return {
+        "wire_bytes": wire_bytes,
+        "audio_seconds": round(audio_seconds, 1),
+        "kbps": round(wire_bytes * 8 / audio_seconds / 1000, 1) if audio_seconds else None,
+        "mb_per_audio_minute": round(wire_bytes * 60 / audio_seconds / 1e6, 3) if audio_seconds else None,
+    }
+
+
+def totals_stats() -> Dict[str, Any]:
+    return {codec: _rates(int(t["wire_bytes"]), t["audio_seconds"]) for codec, t in totals.items()}
+
+
+async def encode(chunks: AsyncIterator[bytes], fmt: DownlinkFormat, meter: Optional[DownlinkMeter] = None) -> AsyncIterator[bytes]:
+    """
+    Turns one sentence of Murf audio into the session's downlink codec,
+    recording how many seconds of audio it holds.
+    """
+    if fmt.transcode:
+        async for chunk in _transcode_opus(_measure_pcm(chunks, fmt, meter, WAV_HEADER_BYTES), fmt):
+            yield chunk
+    elif fmt.codec == MP3:
+        async for chunk in _measure_mp3(chunks, meter):
+            yield chunk
+    else:
+        async for chunk in _measure_pcm(chunks, fmt, meter, WAV_HEADER_BYTES if fmt.codec == WAV else 0):
+            yield chunk
+
+
+async def _measure_pcm(chunks: AsyncIterator[bytes], fmt: DownlinkFormat, meter: Optional[DownlinkMeter], header: int) -> AsyncIterator[bytes]:
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        yield chunk
+    if meter:
+        meter.add_audio(max(total - header, 0) / (fmt.sample_rate * 2))
+
+
+async def _measure_mp3(chunks: AsyncIterator[bytes], meter: Optional[DownlinkMeter]) -> AsyncIterator[bytes]:
+    duration = Mp3Duration()
+    async for chunk in chunks:
+        duration.feed(chunk)
+        yield chunk
+    if meter:
+        meter.add_audio(duration.seconds)
+
+
+async def _transcode_opus(chunks: AsyncIterator[bytes], fmt: DownlinkFormat) -> AsyncIterator[bytes]:
+    """Streams WAV through ffmpeg and yields Opus in WebM as soon as ffmpeg emits it."""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-f", "wav", "-i", "pipe:0",
+        "-ac", "1", "-c:a", "libopus", "-b:a", str(fmt.bitrate), "-application", "voip",
+        "-frame_duration", "20", "-f", "webm", "-cluster_time_limit", "100", "-flush_packets", "1",
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while chunk := await process.stdout.read(PIPE_READ_BYTES):
+            yield chunk
+        await feeder
+        if await process.wait() != 0:
+            raise Exception(f"ffmpeg exited with code {process.returncode} while encoding Opus")
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
@@ -0,0 +1,115 @@
+# services/framing.py
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PcmReframer:
+    """
+    Re-chunks incoming PCM to a fixed duration before it goes to the STT provider.
+
+    Browser frames (~256 ms from a 4096-sample ScriptProcessor, 20 ms frames
+    from the VAD, or whatever the uplink decoder emits) are collected until a
+    `chunk_ms` chunk is complete, and every complete chunk is handed out
+    straight away, so less than one chunk is ever held. Each outgoing chunk
+    is copied out of the pending buffer exactly once. `chunk_ms` trades
+    latency (e.g. 50) for fewer, larger sends (e.g. 200). A partial chunk
+    held longer than `max_hold_ms` is released by `flush_stale`. AssemblyAI
+    v3 rejects chunks shorter than 50 ms, so no chunk is ever smaller than
+    `min_chunk_ms`: a short tail from `flush` is padded with silence.
+
+    Jitter is measured where it happens, at the socket: call `note_arrival`
+    for every client message as it is received. It tracks the smoothed
+    deviation of the inter-arrival time from its running mean, which needs
+    no media timestamps and so works for compressed uplinks too.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        sample_width: int = 2,
+        chunk_ms: int = 50,
+        max_hold_ms: int = 100,
+        min_chunk_ms: int = 50,
+    ):
+        self.bytes_per_ms = sample_rate * sample_width // 1000
+        self.frame_align = sample_width
+        self.min_chunk_bytes = min_chunk_ms * self.bytes_per_ms
+        self.chunk_bytes = max(chunk_ms * self.bytes_per_ms, self.min_chunk_bytes)
+        self.max_hold = max_hold_ms / 1000
+        self._pending = bytearray()
+        self._oldest_at: Optional[float] = None
+        self._last_arrival: Optional[float] = None
+        self.mean_interval = 0.0
+        self.jitter = 0.0
+        self.arrivals = 0
+        self.chunks_out = 0
+        self.bytes_in = 0
+        self.padded_bytes = 0
+
+    @property
+    def depth_ms(self) -> float:
+        return len(self._pending) / self.bytes_per_ms
+
+    def note_arrival(self):
+        """Records that a client message just came off the socket."""
+        now = time.monotonic()
+        if self._last_arrival is not None:
+            interval = now - self._last_arrival
+            # The first interval seeds the mean; after that both follow a 1/16 gain, as in RFC 3550
+            self.mean_interval = interval if self.arrivals == 1 else self.mean_interval + (interval - self.mean_interval) / 16
+            self.jitter += (abs(interval - self.mean_interval) - self.jitter) / 16
+        self._last_arrival = now
+        self.arrivals += 1
+
+    def push(self, data: bytes) -> List[bytes]:
+        """Buffers `data` and returns every complete chunk now available."""
+        self.bytes_in += len(data)
+        self._pending += data
+        if self._oldest_at is None:
+            self._oldest_at = time.monotonic()
+        count = len(self._pending) // self.chunk_bytes
+        if not count:
+            return []
+        with memoryview(self._pending) as view:
+            chunks = [bytes(view[i * self.chunk_bytes:(i + 1) * self.chunk_bytes]) for i in range(count)]
+        self._consume(count * self.chunk_bytes)
+        self.chunks_out += count
+        return chunks
+
+    def flush_stale(self) -> Optional[bytes]:
+        """Releases a partial chunk that has waited longer than `max_hold_ms`."""
+        if self._pending and self._oldest_at is not None and time.monotonic() - self._oldest_at >= self.max_hold:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        """Returns whatever is buffered (frame aligned, padded to `min_chunk_ms`), e.g. at the end of speech."""
+        size = len(self._pending) - len(self._pending) % self.frame_align
+        if not size:
+            return None
+        chunk = bytes(self._pending[:size])
+        self._consume(size)
+        if size < self.min_chunk_bytes:
+            chunk += bytes(self.min_chunk_bytes - size)
+            self.padded_bytes += self.min_chunk_bytes - size
+        self.chunks_out += 1
+        return chunk
+
+    def _consume(self, size: int):
+        del self._pending[:size]
+        # The remainder arrived with the latest push; restart its hold timer
+        self._oldest_at = time.monotonic() if self._pending else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunk_ms": self.chunk_bytes // self.bytes_per_ms,
+            "chunks_out": self.chunks_out,
+            "bytes_in": self.bytes_in,
+            "padded_bytes": self.padded_bytes,
+            "held_ms": round(self.depth_ms, 1),
+            "arrival_interval_ms": round(self.mean_interval * 1000, 1),
+            "jitter_ms": round(self.jitter * 1000, 1),
+        }
@@ -0,0 +1,105 @@
+# services/pipeline.py
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!])\s+')
+
+# Sentinel closing a stage's output queue
+_END = None
+# Sentinel closing a sentence's audio queue when its synthesis failed
+_FAILED = object()
+
+
+async def split_sentences(text_stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Re-chunks streamed LLM text into whole sentences as soon as each one is complete."""
+    buffer = ""
+    async for piece in text_stream:
+        buffer += piece
+        parts = SENTENCE_BOUNDARY.split(buffer)
+        for sentence in parts[:-1]:
+            if sentence.strip():
+                yield sentence.strip()
+        buffer = parts[-1]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def run_turn_pipeline(
+    text_stream: AsyncIterator[str],
+    synthesize: Callable[[str], AsyncIterator[bytes]],
+    on_audio: Callable[[int, bytes], Awaitable[None]],
+    on_sentence_end: Optional[Callable[[int, str], Awaitable[None]]] = None,
+    sentence_queue_size: int = 4,
+    audio_queue_size: int = 64,
+    max_parallel_sentences: int = 3,
+) -> List[str]:
+    """
+    Runs one assistant turn as three overlapping stages:
+
+      LLM text -> sentence queue -> TTS fan-out -> reorder buffer -> socket sender
+
+    TTS starts on sentence N while sentence N+1 is still being generated, and up
+    to `max_parallel_sentences` sentences are synthesized at once. Each sentence
+    streams into its own bounded queue; the sender drains those queues strictly
+    in sentence order, so the head sentence is forwarded live while later ones
+    buffer behind it. `synthesize` is called in sentence order, so a
+    synthesizer that queues for a shared resource when called (as
+    tts.stream_speech does) serves the head sentence first. A failure in the
+    LLM stage or the sender cancels the turn; a sentence whose TTS fails is
+    skipped, and neither counted as delivered nor passed to `on_sentence_end`.
+    Returns the sentences whose audio was fully delivered.
+    """
+    sentences: asyncio.Queue = asyncio.Queue(maxsize=sentence_queue_size)
+    reorder: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_parallel_sentences)
+    delivered: List[str] = []
+
+    async def llm_stage():
+        index = 0
+        async for sentence in split_sentences(text_stream):
+            await sentences.put((index, sentence))
+            index += 1
+        await sentences.put(_END)
+
+    async def synthesize_into(index: int, audio: AsyncIterator[bytes], out: asyncio.Queue):
+        try:
+            async for chunk in audio:
+                await out.put(chunk)
+        except Exception as e:
+            logger.error(f"TTS failed for sentence {index}: {e}")
+            await out.put(_FAILED)
+            return
+        await out.put(_END)
+
+    async def tts_stage(group: asyncio.TaskGroup):
+        while (item := await sentences.get()) is not _END:
+            index, sentence = item
+            await slots.acquire()
+            out: asyncio.Queue = asyncio.Queue(maxsize=audio_queue_size)
+            await reorder.put((index, sentence, out))
+            # Called here rather than in the task so sentences ask for synthesis in order
+            group.create_task(synthesize_into(index, synthesize(sentence), out))
+        await reorder.put(_END)
+
+    async def send_stage():
+        while (item := await reorder.get()) is not _END:
+            index, sentence, out = item
+            while (chunk := await out.get()) is not _END and chunk is not _FAILED:
+                await on_audio(index, chunk)
+            slots.release()
+            if chunk is _FAILED:
+                continue
+            delivered.append(sentence)
+            if on_sentence_end:
+                await on_sentence_end(index, sentence)
+
+    async with asyncio.TaskGroup() as group:
+        group.create_task(llm_stage())
+        group.create_task(tts_stage(group))
+        group.create_task(send_stage())
+
+    return delivered
@@ -0,0 +1,85 @@
+# services/protocol.py
+"""
+/ws wire protocol for assistant audio.
+
+Version 0 (legacy): audio travels as base64 inside JSON text messages.
+Version 1: audio travels as binary WebSocket frames, each prefixed with a
+fixed 12-byte big-endian header; control messages stay JSON.
+
+    offset  size  field
+    0       1     protocol version (1)
+    1       1     codec (see CODEC_*)
+    2       1     flags (FLAG_FINAL: last frame of the sentence)
+    3       1     reserved (0)
+    4       4     turn id
+    8       2     sentence index within the turn
+    10      2     sequence number within the sentence
+"""
+import base64
+import struct
+from typing import Any, Dict, NamedTuple, Tuple, Union
+
+PROTOCOL_VERSION = 1
+
+CODEC_WAV = 1
+CODEC_PCM16 = 2
+CODEC_MP3 = 3
+CODEC_OPUS = 4
+
+FLAG_FINAL = 0x01
+
+HEADER = struct.Struct("!BBBBIHH")
+
+
+class FrameHeader(NamedTuple):
+    version: int
+    codec: int
+    flags: int
+    turn_id: int
+    sentence: int
+    seq: int
+
+    @property
+    def final(self) -> bool:
+        return bool(self.flags & FLAG_FINAL)
+
+
+def encode_audio_frame(turn_id: int, sentence: int, seq: int, payload: bytes, codec: int = CODEC_WAV, final: bool = False) -> bytes:
+    header = HEADER.pack(PROTOCOL_VERSION, codec, FLAG_FINAL if final else 0, 0, turn_id, sentence & 0xFFFF, seq & 0xFFFF)
+    return header + payload
+
+
+def decode_audio_frame(frame: bytes) -> Tuple[FrameHeader, memoryview]:
+    version, codec, flags, _, turn_id, sentence, seq = HEADER.unpack_from(frame)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported audio frame version {version}")
+    return FrameHeader(version, codec, flags, turn_id, sentence, seq), memoryview(frame)[HEADER.size:]
+
+
+class AudioFramer:
+    """
+    Frames one turn's audio for the protocol version the client negotiated.
+    Returns bytes for binary frames (v1) or a dict for JSON messages (v0).
+    """
+
+    def __init__(self, turn_id: int, protocol: int = PROTOCOL_VERSION, codec: int = CODEC_WAV):
+        self.turn_id = turn_id
+        self.binary = protocol >= 1
+        self.codec = codec
+        self._seq: Dict[int, int] = {}
+
+    def _next_seq(self, sentence: int) -> int:
+        seq = self._seq.get(sentence, 0)
+        self._seq[sentence] = seq + 1
+        return seq
+
+    def chunk(self, sentence: int, payload: bytes) -> Union[bytes, Dict[str, Any]]:
+        if self.binary:
+            return encode_audio_frame(self.turn_id, sentence, self._next_seq(sentence), payload, self.codec)
+        b64_audio = base64.b64encode(payload).decode('utf-8')
+        return {"type": "audio_chunk", "turn": self.turn_id, "sentence": sentence, "b64": b64_audio}
+
+    def end(self, sentence: int) -> Union[bytes, Dict[str, Any]]:
+        if self.binary:
+            return encode_audio_frame(self.turn_id, sentence, self._next_seq(sentence), b"", self.codec, final=True)
+        return {"type": "audio_end", "turn": self.turn_id, "sentence": sentence}
@@ -0,0 +1,173 @@
+# services/speculation.py
+import asyncio
+import difflib
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Builds the LLM stream (LLMStream or anything with text/history/completed) for a user query
+StreamFactory = Callable[[str], Any]
+
+_WORD = re.compile(r"[\w']+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def similarity(a: str, b: str) -> float:
+    """Word-level similarity of two transcripts, ignoring case and punctuation."""
+    a_words, b_words = normalize(a).split(), normalize(b).split()
+    if not a_words and not b_words:
+        return 1.0
+    return difflib.SequenceMatcher(None, a_words, b_words).ratio()
+
+
+class Speculation:
+    """
+    An LLM request started from a partial transcript. The reply is buffered
+    while it streams; once committed, iterating replays the buffer and then
+    follows the live stream. Exposes the same text/history/completed
+    attributes as the stream it wraps, so it can stand in for an LLMStream.
+    """
+
+    def __init__(self, query: str, stream: Any):
+        self.query = query
+        self.stream = stream
+        self.started_at = time.perf_counter()
+        self.first_piece_at: Optional[float] = None
+        self.pieces: List[str] = []
+        self._more = asyncio.Event()
+        self._task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        try:
+            async for piece in self.stream:
+                if self.first_piece_at is None:
+                    self.first_piece_at = time.perf_counter()
+                self.pieces.append(piece)
+                self._more.set()
+        finally:
+            self._more.set()
+
+    @property
+    def text(self) -> str:
+        return self.stream.text
+
+    @property
+    def history(self) -> List[Any]:
+        return self.stream.history
+
+    @property
+    def completed(self) -> bool:
+        return self.stream.completed
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        index = 0
+        try:
+            while True:
+                while index < len(self.pieces):
+                    yield self.pieces[index]
+                    index += 1
+                if self._task.done():
+                    return
+                self._more.clear()
+                await self._more.wait()
+        finally:
+            # The consuming turn was cancelled (e.g. barge-in): stop the request too
+            self.cancel()
+
+    def cancel(self):
+        if not self._task.done():
+            self._task.cancel()
+
+
+class SpeculativeTurns:
+    """
+    Starts the LLM request before the user's turn officially ends.
+
+    Every partial transcript restarts a stability timer. If the partial stays
+    unchanged for `stable_for` seconds, the request for it starts in the
+    background. When the final transcript arrives, `claim` commits the
+    speculation if the two transcripts match within `match_ratio`. Otherwise
+    the speculation is cancelled and the caller starts a normal request.
+    """
+
+    def __init__(self, make_stream: StreamFactory, stable_for: float = 0.4, match_ratio: float = 0.9):
+        self.make_stream = make_stream
+        self.stable_for = stable_for
+        self.match_ratio = match_ratio
+        self.current: Optional[Speculation] = None
+        self._partial = ""
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.started = 0
+        self.committed = 0
+        self.discarded = 0
+        self.latency_saved = 0.0
+
+    def on_partial(self, text: str):
+        """Feeds an interim transcript. Call on the event loop."""
+        if normalize(text) == normalize(self._partial):
+            return
+        self._partial = text
+        if self.current is not None and similarity(self.current.query, text) < self.match_ratio:
+            # The user kept talking; the speculative answer no longer fits
+            self._discard()
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.stable_for, self._start, text)
+
+    def _start(self, text: str):
+        self._timer = None
+        if self.current is not None:
+            return
+        self.started += 1
+        logger.info(f"Speculating on stable partial: {text}")
+        self.current = Speculation(text, self.make_stream(text))
+
+    def _discard(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+            self.discarded += 1
+
+    def claim(self, final_text: str) -> Optional[Speculation]:
+        """Returns the speculation if it matches the final transcript, cancelling it otherwise."""
+        self.reset()
+        speculation, self.current = self.current, None
+        if speculation is None:
+            return None
+        if similarity(speculation.query, final_text) < self.match_ratio:
+            speculation.cancel()
+            self.discarded += 1
+            logger.info(f"Speculation discarded: '{speculation.query}' vs final '{final_text}'")
+            return None
+        self.committed += 1
+        # Time the reply was ahead: up to its first token, or the whole wait if still pending
+        now = time.perf_counter()
+        self.latency_saved += min(now, speculation.first_piece_at or now) - speculation.started_at
+        return speculation
+
+    def reset(self):
+        """Forgets the pending partial, e.g. when the turn ends or another skill answers it."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._partial = ""
+
+    def cancel(self):
+        self.reset()
+        self._discard()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "committed": self.committed,
+            "discarded": self.discarded,
+            "win_rate": round(self.committed / self.started, 3) if self.started else None,
+            "latency_saved_ms_total": round(self.latency_saved * 1000, 1),
+            "latency_saved_ms_avg": round(self.latency_saved * 1000 / self.committed, 1) if self.committed else None,
+        }
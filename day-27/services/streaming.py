@@ -0,0 +1,72 @@
+# services/streaming.py
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+async def iterate_in_thread(
+    make_iterable: Callable[[], Iterable[T]],
+    maxsize: int = 16,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[T]:
+    """
+    Drives a blocking iterator (Murf/Gemini SDK streams) on a worker thread and
+    yields its items on the event loop as soon as they are produced.
+
+    At most `maxsize` items are buffered; the worker blocks when the consumer
+    falls behind. Closing the async generator stops the worker at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(maxsize)
+    stopped = threading.Event()
+
+    def deliver(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            # Event loop already closed; nobody is listening any more
+            stopped.set()
+
+    def produce():
+        iterator = None
+        try:
+            iterator = iter(make_iterable())
+            for item in iterator:
+                while not slots.acquire(timeout=0.1):
+                    if stopped.is_set():
+                        return
+                if stopped.is_set():
+                    return
+                deliver(item)
+            deliver(_DONE)
+        except Exception as e:
+            deliver(_DONE, e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if stopped.is_set() and close:
+                try:
+                    close()
+                except Exception as close_err:
+                    logger.debug(f"Error closing stream: {close_err}")
+
+    loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                break
+            slots.release()
+            yield item
+    finally:
+        stopped.set()
@@ -2,6 +2,8 @@
 import assemblyai as aai
 from fastapi import UploadFile
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
 from assemblyai.streaming.v3 import (
     StreamingClient,
@@ -21,6 +23,9 @@ load_dotenv()
 aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY") or ""
 
 
+ASSEMBLYAI_STREAMING_HOST = "streaming.assemblyai.com"
+
+
 def _on_begin(client: StreamingClient, event: BeginEvent):
     print(f"AAI session started: {event.id}")
 
@@ -33,45 +38,93 @@ def _on_error(client: StreamingClient, error: StreamingError):
     print("AAI error:", error)
 
 
-class AssemblyAIStreamingTranscriber:
+class StreamingSession:
     """
-    Wrapper around AAI StreamingClient that exposes:
-      - on_partial_callback(text) for interim results
-      - on_final_callback(text)   when end_of_turn=True
+    A connected AAI StreamingClient. Turn events go to whichever transcriber
+    currently owns the session, so a session can be opened ahead of time
+    (see services.stt_pool) and handed to a transcriber later.
     """
 
-    def __init__(
-        self,
-        sample_rate: int = 16000,
-        on_partial_callback=None,
-        on_final_callback=None,
-    ):
-        self.on_partial_callback = on_partial_callback
-        self.on_final_callback = on_final_callback
+    def __init__(self, api_key: str, sample_rate: int = 16000, api_host: str = ASSEMBLYAI_STREAMING_HOST):
+        self.api_key = api_key
+        self.sample_rate = sample_rate
+        self.owner = None
+        self.closed = False
+        self.created_at = time.monotonic()
 
         self.client = StreamingClient(
             StreamingClientOptions(
-                api_key=aai.settings.api_key,
-                api_host="streaming.assemblyai.com",
+                api_key=api_key,
+                api_host=api_host,
             )
         )
 
         # register events
         self.client.on(StreamingEvents.Begin, _on_begin)
-        self.client.on(StreamingEvents.Error, _on_error)
-        self.client.on(StreamingEvents.Termination, _on_termination)
-        self.client.on(
-            StreamingEvents.Turn,
-            lambda client, event: self._on_turn(client, event),
-        )
+        self.client.on(StreamingEvents.Error, self._on_error)
+        self.client.on(StreamingEvents.Termination, self._on_termination)
+        self.client.on(StreamingEvents.Turn, self._on_turn)
 
+    def connect(self):
+        """Blocks until the handshake completes; `closed` is set if it failed."""
         self.client.connect(
             StreamingParameters(
-                sample_rate=sample_rate,
+                sample_rate=self.sample_rate,
                 format_turns=False,
             )
         )
 
+    def _on_turn(self, client: StreamingClient, event: TurnEvent):
+        if self.owner is not None:
+            self.owner._on_turn(client, event)
+
+    def _on_error(self, client: StreamingClient, error: StreamingError):
+        self.closed = True
+        _on_error(client, error)
+
+    def _on_termination(self, client: StreamingClient, event: TerminationEvent):
+        self.closed = True
+        _on_termination(client, event)
+
+    def close(self):
+        self.closed = True
+        self.client.disconnect(terminate=True)
+
+
+def open_session(api_key: str, sample_rate: int = 16000, api_host: str = ASSEMBLYAI_STREAMING_HOST) -> StreamingSession:
+    """Opens a streaming session, blocking for the handshake."""
+    session = StreamingSession(api_key, sample_rate, api_host)
+    session.connect()
+    if session.closed:
+        raise ConnectionError("Could not open an AssemblyAI streaming session")
+    return session
+
+
+class AssemblyAIStreamingTranscriber:
+    """
+    Wrapper around AAI StreamingClient that exposes:
+      - on_partial_callback(text) for interim results
+      - on_final_callback(text)   when end_of_turn=True
+
+    Pass an already connected `session` (e.g. from the session pool) to skip
+    the handshake; otherwise one is opened here, blocking until connected.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        on_partial_callback=None,
+        on_final_callback=None,
+        session: Optional[StreamingSession] = None,
+        api_key: Optional[str] = None,
+    ):
+        self.on_partial_callback = on_partial_callback
+        self.on_final_callback = on_final_callback
+
+        self.session = session or open_session(api_key or aai.settings.api_key, sample_rate)
+        self.session.owner = self
+        self.client = self.session.client
+
     def _on_turn(self, client: StreamingClient, event: TurnEvent):
         text = (event.transcript or "").strip()
         if not text:
@@ -93,8 +146,12 @@ class AssemblyAIStreamingTranscriber:
     def stream_audio(self, audio_chunk: bytes):
         self.client.stream(audio_chunk)
 
+    def force_endpoint(self):
+        """Ends the current turn now, e.g. when local VAD has seen the speaker stop."""
+        self.client.force_endpoint()
+
     def close(self):
-        self.client.disconnect(terminate=True)
+        self.session.close()
 
 
 def transcribe_audio(audio_file: UploadFile) -> str:
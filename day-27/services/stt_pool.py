@@ -0,0 +1,167 @@
+# services/stt_pool.py
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.stt import StreamingSession, open_session
+
+logger = logging.getLogger(__name__)
+
+# (api key hash, sample rate)
+PoolKey = Tuple[str, int]
+
+
+def _pool_key(api_key: str, sample_rate: int) -> PoolKey:
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16], sample_rate
+
+
+class STTSessionPool:
+    """
+    Keeps AssemblyAI streaming sessions connected ahead of time so a new
+    conversation skips the handshake.
+
+    Sessions are pooled per (API key, sample rate) and a session that has
+    been idle longer than `idle_ttl` seconds is closed. Keys warmed with
+    `keep_warm=True` (opted in with STT_POOL_KEEP_WARM_KEYS) are kept at
+    `size_per_key` sessions: `acquire` tops them back up, and so does the reaper after
+    expiring their sessions. Any other key is only topped up by an `acquire`
+    that comes within `idle_ttl` of the previous one for that key, so a key
+    seen once, or no longer used, never holds a session of its own.
+    """
+
+    def __init__(
+        self,
+        size_per_key: int = 1,
+        idle_ttl: float = 60.0,
+        connect: Callable[[str, int], StreamingSession] = open_session,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        self.size_per_key = size_per_key
+        self.idle_ttl = idle_ttl
+        self._connect = connect
+        self._executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="stt-pool")
+        self._lock = threading.Lock()
+        self._idle: Dict[PoolKey, List[StreamingSession]] = defaultdict(list)
+        self._refilling: Dict[PoolKey, int] = defaultdict(int)
+        # Keys kept warm regardless of use: key -> (api key, sample rate)
+        self._kept: Dict[PoolKey, Tuple[str, int]] = {}
+        # When each other key was last acquired
+        self._last_used: Dict[PoolKey, float] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.counters = {"hits": 0, "misses": 0, "connects": 0, "connect_failures": 0, "expired": 0}
+
+    def start(self):
+        """Starts the idle-expiry task. Call on the server loop."""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def acquire(self, api_key: str, sample_rate: int = 16000) -> StreamingSession:
+        """Returns a connected session, pre-warmed when available."""
+        key = _pool_key(api_key, sample_rate)
+        session = self._take(key)
+        now = time.monotonic()
+        last_used = self._last_used.get(key)
+        if key in self._kept or (last_used is not None and now - last_used <= self.idle_ttl):
+            self.warm(api_key, sample_rate)
+        if key not in self._kept:
+            self._last_used[key] = now
+        if session is not None:
+            self.counters["hits"] += 1
+            return session
+        self.counters["misses"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._open, api_key, sample_rate)
+
+    def warm(self, api_key: str, sample_rate: int = 16000, keep_warm: bool = False):
+        """Tops this key's pool up to `size_per_key` in the background; `keep_warm` keeps it there."""
+        key = _pool_key(api_key, sample_rate)
+        if keep_warm:
+            self._kept[key] = (api_key, sample_rate)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            missing = self.size_per_key - len(self._idle[key]) - self._refilling[key]
+            self._refilling[key] += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            loop.run_in_executor(self._executor, self._refill, key, api_key, sample_rate)
+
+    def _open(self, api_key: str, sample_rate: int) -> StreamingSession:
+        try:
+            session = self._connect(api_key, sample_rate)
+        except Exception:
+            self.counters["connect_failures"] += 1
+            raise
+        self.counters["connects"] += 1
+        return session
+
+    def _refill(self, key: PoolKey, api_key: str, sample_rate: int):
+        try:
+            session = self._open(api_key, sample_rate)
+        except Exception as e:
+            logger.warning(f"Could not pre-warm an AssemblyAI session: {e}")
+            with self._lock:
+                self._refilling[key] -= 1
+            return
+        with self._lock:
+            self._refilling[key] -= 1
+            self._idle[key].append(session)
+
+    def _take(self, key: PoolKey) -> Optional[StreamingSession]:
+        now = time.monotonic()
+        stale = []
+        session = None
+        with self._lock:
+            idle = self._idle[key]
+            while idle:
+                candidate = idle.pop()
+                if candidate.closed or now - candidate.created_at > self.idle_ttl:
+                    stale.append(candidate)
+                    continue
+                session = candidate
+                break
+        self._close_all(stale)
+        return session
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(max(self.idle_ttl / 4, 1))
+            now = time.monotonic()
+            expired = []
+            with self._lock:
+                for key, idle in self._idle.items():
+                    keep = [s for s in idle if not s.closed and now - s.created_at <= self.idle_ttl]
+                    expired.extend(s for s in idle if s not in keep)
+                    idle[:] = keep
+            self._close_all(expired)
+            for key in [k for k, used in self._last_used.items() if now - used > self.idle_ttl]:
+                del self._last_used[key]
+            # Replace what expired for the keys that must stay warm
+            for api_key, sample_rate in self._kept.values():
+                self.warm(api_key, sample_rate)
+
+    def _close_all(self, sessions: List[StreamingSession]):
+        for session in sessions:
+            self.counters["expired"] += 1
+            self._executor.submit(session.close)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pooled = {f"{key[0]}@{key[1]}": len(idle) for key, idle in self._idle.items() if idle}
+        return {**self.counters, "pooled": pooled}
+
+    def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                logger.debug(f"Error closing pooled AssemblyAI session: {e}")
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,45 +1,476 @@
 # services/tts.py
 import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, BinaryIO, Deque, Iterator, Optional, Tuple, Union
 from config import MURF_API_KEY # Import the key from config
+import config
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
 from murf import Murf
+from services.pipeline import SENTENCE_BOUNDARY
+from services.streaming import iterate_in_thread
+from services.tts_cache import TTSCache
 from pathlib import Path
+import asyncio
+import hashlib
+import httpx
 import logging
 import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 MURF_API_URL = "https://api.murf.ai/v1/speech"
 
+# Voice used by the streaming assistant (part of the audio cache key)
+VOICE_ID = "en-US-ken"
+VOICE_STYLE = "Conversational"
+AUDIO_FORMAT = "WAV"
+SAMPLE_RATE = 44100
+
+# Cached audio is replayed in slices so it flows through the same chunked path as live audio
+CACHE_CHUNK_SIZE = 32 * 1024
+
 # Ensure uploads folder exists
 UPLOADS_DIR = Path(__file__).resolve().parent.parent / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 
 
-def speak(text: str, output_file: str = "stream_output.wav"):
+@dataclass
+class _PooledClient:
+    """A Murf client bound to its own keep-alive httpx connection pool."""
+    client: Murf
+    http_client: httpx.Client
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    in_flight: int = 0
+    total_requests: int = 0
+
+
+class _ResizableLimit:
+    """A semaphore whose size can change while requests hold or wait for it. Event loop only."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def reserve(self) -> asyncio.Future:
+        """Takes a place in line now; the returned future completes once a slot is granted."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wake()
+        return waiter
+
+    def cancel(self, waiter: asyncio.Future):
+        """Gives up a reservation, handing its slot on if it was already granted."""
+        if waiter.done() and not waiter.cancelled():
+            self.release()
+        else:
+            waiter.cancel()
+
+    async def acquire(self):
+        waiter = self.reserve()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            self.cancel(waiter)
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def resize(self, limit: int):
+        self.limit = limit
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.active < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+
+class SlotReservation:
     """
-    Convert text to speech using Murf API and save audio in uploads folder.
+    A place in line for one synthesis slot, taken when it is created. `wait`
+    returns once the slot is granted; `release` gives up the slot or the place
+    in line. A reservation dropped without being released releases itself.
+    """
+
+    def __init__(self, slots: _ResizableLimit):
+        self._slots = slots
+        self._waiter = slots.reserve()
+        self._released = False
+
+    async def wait(self):
+        await self._waiter
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._slots.cancel(self._waiter)
+
+    def __del__(self):
+        try:
+            self.release()
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+
+class TTSClientManager:
+    """
+    Process-wide registry of Murf clients, one keep-alive connection pool per API key.
+
+    Clients are shared across WebSocket sessions so consecutive sentences reuse
+    warm HTTPS connections. Pools that stay idle longer than `idle_timeout` are
+    closed the next time the registry is touched.
+
+    Concurrent syntheses per key are capped (see `limit` and `reserve`) to stay
+    under Murf's rate limits, granting slots in the order they were asked for.
+    The cap is `max_concurrency`; a client bringing its own key may lower it
+    for that key with `set_concurrency_limit`, never raise it. A key's limit
+    state is dropped once its pool is closed and no request holds or waits
+    for a slot.
     """
-    client = Murf(api_key=MURF_API_KEY)
 
-    file_path = UPLOADS_DIR / output_file
+    def __init__(
+        self,
+        max_connections: int = 10,
+        max_keepalive: int = 5,
+        idle_timeout: float = 60.0,
+        request_timeout: float = 60.0,
+        max_concurrency: int = 3,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.max_concurrency = max_concurrency
+        self._clients: Dict[str, _PooledClient] = {}
+        self._lock = threading.Lock()
+        self._concurrency_limits: Dict[str, int] = {}
+        self._limits: Dict[str, _ResizableLimit] = {}
+
+    @staticmethod
+    def _pool_id(api_key: str) -> str:
+        # Never expose raw API keys through metrics or logs
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+    def _create(self, api_key: str) -> _PooledClient:
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.idle_timeout,
+            ),
+            timeout=self.request_timeout,
+        )
+        client = Murf(api_key=api_key, httpx_client=http_client)
+        logger.info(f"Created Murf connection pool {self._pool_id(api_key)}")
+        return _PooledClient(client=client, http_client=http_client)
+
+    def _evict_idle(self, now: float):
+        """Closes pools with no in-flight requests that have been idle too long. Caller holds the lock."""
+        for pool_id, entry in list(self._clients.items()):
+            if entry.in_flight == 0 and now - entry.last_used > self.idle_timeout:
+                entry.http_client.close()
+                del self._clients[pool_id]
+                self._concurrency_limits.pop(pool_id, None)
+                logger.info(f"Closed idle Murf connection pool {pool_id}")
+
+    @contextmanager
+    def client(self, api_key: str) -> Iterator[Murf]:
+        """Borrows the shared Murf client for `api_key`, tracking it as in flight."""
+        if not api_key:
+            raise Exception("MURF_API_KEY not configured.")
+
+        pool_id = self._pool_id(api_key)
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            entry = self._clients.get(pool_id)
+            if entry is None:
+                entry = self._clients[pool_id] = self._create(api_key)
+            entry.in_flight += 1
+            entry.total_requests += 1
+
+        try:
+            yield entry.client
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+                entry.last_used = time.monotonic()
+
+    def set_concurrency_limit(self, api_key: str, limit: int) -> bool:
+        """
+        Lowers how many syntheses may run at once for a client-supplied `api_key`,
+        clamped to 1..`max_concurrency`. The server's own key is shared by every
+        session, so its limit can't be changed this way; returns False then.
+        """
+        if api_key == MURF_API_KEY:
+            logger.warning("Ignoring a client request to change the server Murf key's concurrency limit")
+            return False
+        pool_id = self._pool_id(api_key)
+        limit = min(max(1, limit), self.max_concurrency)
+        self._concurrency_limits[pool_id] = limit
+        # Resized in place: requests holding or waiting for a slot keep their place
+        if pool_id in self._limits:
+            self._limits[pool_id].resize(limit)
+        return True
+
+    def _slots(self, api_key: str) -> _ResizableLimit:
+        """The slot limit for `api_key`, pruning those of closed, unused pools. Event loop only."""
+        if not api_key:
+            raise Exception("MURF_API_KEY not configured.")
+
+        with self._lock:
+            live = set(self._clients)
+        for pool_id, slots in list(self._limits.items()):
+            if pool_id not in live and slots.active == 0 and not slots.waiting:
+                del self._limits[pool_id]
+        pool_id = self._pool_id(api_key)
+        slots = self._limits.get(pool_id)
+        if slots is None:
+            slots = self._limits[pool_id] = _ResizableLimit(self._concurrency_limits.get(pool_id, self.max_concurrency))
+        return slots
+
+    def reserve(self, api_key: str) -> SlotReservation:
+        """Queues for a synthesis slot for `api_key` without waiting for it. Must be used from the event loop."""
+        return SlotReservation(self._slots(api_key))
+
+    @asynccontextmanager
+    async def limit(self, api_key: str):
+        """Waits for a synthesis slot for `api_key`. Must be used from the event loop."""
+        reservation = self.reserve(api_key)
+        try:
+            await reservation.wait()
+            yield
+        finally:
+            reservation.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Returns pool configuration plus per-key in-flight and usage counters."""
+        with self._lock:
+            now = time.monotonic()
+            pools = {
+                pool_id: {
+                    "concurrency_limit": self._concurrency_limits.get(pool_id, self.max_concurrency),
+                    "waiting": self._limits[pool_id].waiting if pool_id in self._limits else 0,
+                    "in_flight": entry.in_flight,
+                    "total_requests": entry.total_requests,
+                    "idle_seconds": round(now - entry.last_used, 3) if entry.in_flight == 0 else 0.0,
+                    "age_seconds": round(now - entry.created_at, 3),
+                }
+                for pool_id, entry in self._clients.items()
+            }
+        return {
+            "pool_count": len(pools),
+            "max_connections_per_pool": self.max_connections,
+            "max_keepalive_per_pool": self.max_keepalive,
+            "idle_timeout_seconds": self.idle_timeout,
+            "in_flight": sum(p["in_flight"] for p in pools.values()),
+            "pools": pools,
+        }
+
+    def close(self):
+        """Closes every pooled connection. Called on application shutdown."""
+        with self._lock:
+            for entry in self._clients.values():
+                entry.http_client.close()
+            self._clients.clear()
+            self._concurrency_limits.clear()
 
-    # Start with a clean file
-    open(file_path, "wb").close()
 
-    res = client.text_to_speech.stream(
-        text=text,
-        voice_id="en-US-ken",
-        style="Conversational"
-    )
+client_manager = TTSClientManager(
+    max_connections=config.TTS_POOL_MAX_CONNECTIONS,
+    max_keepalive=config.TTS_POOL_MAX_KEEPALIVE,
+    idle_timeout=config.TTS_POOL_IDLE_TIMEOUT,
+    max_concurrency=config.TTS_MAX_CONCURRENCY_PER_KEY,
+)
 
-    audio_bytes = b""
-    for audio_chunk in res:
-        audio_bytes += audio_chunk
-        with open(file_path, "ab") as f:
-            f.write(audio_chunk)
 
-    return audio_bytes
+class AudioRecorder:
+    """
+    Recorder sink that keeps a single file handle open for a whole synthesis,
+    instead of reopening the file for every chunk.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file: Optional[BinaryIO] = None
+
+    def open(self) -> "AudioRecorder":
+        self._file = open(self.path, "wb")
+        return self
+
+    def write(self, chunk: bytes):
+        if self._file is not None:
+            self._file.write(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "AudioRecorder":
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+audio_cache = TTSCache(
+    Path(config.TTS_CACHE_DIR) if config.TTS_CACHE_DIR else UPLOADS_DIR / "tts_cache",
+    memory_budget=config.TTS_CACHE_MEMORY_BYTES,
+    disk_budget=config.TTS_CACHE_DISK_BYTES,
+) if config.TTS_CACHE_ENABLED else None
+
+
+def _cache_key(text: str, audio_format: str = AUDIO_FORMAT, sample_rate: int = SAMPLE_RATE) -> str:
+    return TTSCache.make_key(text, VOICE_ID, VOICE_STYLE, audio_format, sample_rate)
+
+
+def _replay(cached: bytes, recorder: Optional[AudioRecorder] = None) -> Iterator[bytes]:
+    """Yields cached audio in slices, like a live Murf stream."""
+    for start in range(0, len(cached), CACHE_CHUNK_SIZE):
+        audio_chunk = cached[start:start + CACHE_CHUNK_SIZE]
+        if recorder:
+            recorder.write(audio_chunk)
+        yield audio_chunk
+
+
+def _stream_from_murf(
+    text: str,
+    api_key: Optional[str],
+    recorder: Optional[AudioRecorder] = None,
+    audio_format: str = AUDIO_FORMAT,
+    sample_rate: int = SAMPLE_RATE,
+) -> Iterator[bytes]:
+    """
+    Yields Murf audio chunks for `text` as they arrive, using the shared
+    connection pool, and stores the audio in the cache once it is complete.
+    """
+    chunks = []
+    with client_manager.client(api_key or MURF_API_KEY) as client:
+        res = client.text_to_speech.stream(
+            text=text,
+            voice_id=VOICE_ID,
+            style=VOICE_STYLE,
+            format=audio_format,
+            sample_rate=sample_rate,
+        )
+        for audio_chunk in res:
+            chunks.append(audio_chunk)
+            if recorder:
+                recorder.write(audio_chunk)
+            yield audio_chunk
+
+    if audio_cache:
+        audio_cache.put(_cache_key(text, audio_format, sample_rate), b"".join(chunks))
+
+
+def _synthesize(text: str, api_key: Optional[str], recorder: Optional[AudioRecorder] = None) -> Iterator[bytes]:
+    """Yields audio chunks for `text`, from the cache when possible."""
+    cached = audio_cache.get(_cache_key(text)) if audio_cache else None
+    if cached is not None:
+        yield from _replay(cached, recorder)
+    else:
+        yield from _stream_from_murf(text, api_key, recorder)
+
+
+def stream_speech(
+    text: str,
+    api_key: Optional[str] = None,
+    recorder: Optional[AudioRecorder] = None,
+    audio_format: str = AUDIO_FORMAT,
+    sample_rate: int = SAMPLE_RATE,
+) -> AsyncIterator[bytes]:
+    """
+    Async iterator yielding Murf audio chunks as soon as they are received.
+    For WAV the first chunk carries the header and the rest is raw PCM;
+    `audio_format` can also be e.g. "MP3" or headerless "PCM".
+    The blocking SDK stream runs on a worker thread so the event loop stays free.
+
+    Cache hits skip Murf entirely; misses wait for a per-key synthesis slot.
+    The place in line for that slot is taken when this is called, not when the
+    stream is first read, so sentences requested in order are granted slots in
+    order: a later sentence can never hold the slot an earlier one is waiting
+    for while its own audio backs up behind it. Must be called from the event loop.
+    """
+    reservation = client_manager.reserve(api_key or MURF_API_KEY)
+    return _speech_stream(text, api_key, recorder, audio_format, sample_rate, reservation)
+
+
+async def _speech_stream(
+    text: str,
+    api_key: Optional[str],
+    recorder: Optional[AudioRecorder],
+    audio_format: str,
+    sample_rate: int,
+    reservation: SlotReservation,
+) -> AsyncIterator[bytes]:
+    try:
+        key = _cache_key(text, audio_format, sample_rate)
+        cached = await asyncio.to_thread(audio_cache.get, key) if audio_cache else None
+        if cached is None:
+            await reservation.wait()
+            async for audio_chunk in iterate_in_thread(lambda: _stream_from_murf(text, api_key, recorder, audio_format, sample_rate)):
+                yield audio_chunk
+            return
+    finally:
+        reservation.release()
+    for audio_chunk in _replay(cached, recorder):
+        yield audio_chunk
+
+
+def speak(text: str, api_key: Optional[str] = None, output_file: str = "stream_output.wav"):
+    """
+    Convert text to speech using Murf API and save audio in uploads folder.
+    Uses the shared connection pool for `api_key` (defaults to MURF_API_KEY).
+    """
+    with AudioRecorder(UPLOADS_DIR / output_file) as recorder:
+        return b"".join(_synthesize(text, api_key, recorder))
+
+
+def warm_cache(
+    phrases: List[str],
+    api_key: Optional[str] = None,
+    outputs: Optional[List[Tuple[str, int]]] = None,
+) -> Tuple[int, int]:
+    """
+    Synthesizes `phrases` into the audio cache ahead of time, once per
+    (Murf format, sample rate) in `outputs` (default: this module's WAV).
+    Phrases are split into sentences first, since turns look up the cache
+    one sentence at a time. Returns (entries now cached, entries attempted).
+    """
+    if not audio_cache:
+        return 0, 0
+    sentences = list(dict.fromkeys(
+        sentence.strip() for phrase in phrases for sentence in SENTENCE_BOUNDARY.split(phrase) if sentence.strip()
+    ))
+    outputs = outputs or [(AUDIO_FORMAT, SAMPLE_RATE)]
+    warmed = 0
+    for sentence in sentences:
+        for audio_format, sample_rate in outputs:
+            if audio_cache.get(_cache_key(sentence, audio_format, sample_rate)) is not None:
+                warmed += 1
+                continue
+            try:
+                for _ in _stream_from_murf(sentence, api_key, None, audio_format, sample_rate):
+                    pass
+                warmed += 1
+            except Exception as e:
+                logger.error(f"Could not warm TTS cache for {sentence!r} as {audio_format}/{sample_rate}: {e}")
+    return warmed, len(sentences) * len(outputs)
 
 
 def convert_text_to_speech(text: str, voice_id: str = "en-US-natalie") -> str:
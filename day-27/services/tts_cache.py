@@ -0,0 +1,192 @@
+# services/tts_cache.py
+import argparse
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized audio with two tiers:
+
+      - an in-memory LRU bounded by `memory_budget` bytes
+      - an on-disk store under `directory`, bounded by `disk_budget` bytes,
+        read back in a single read and promoted into memory on a hit
+
+    Entries are keyed by everything that changes the audio (text, voice, style,
+    format and sample rate). Safe to use from worker threads.
+    """
+
+    def __init__(self, directory: Path, memory_budget: int = 32 * 1024 * 1024, disk_budget: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "stores": 0,
+        }
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, style: str, audio_format: str, sample_rate: int) -> str:
+        raw = "\x1f".join([text.strip(), voice_id, style, audio_format.upper(), str(sample_rate)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.audio"
+
+    def _load_disk_index(self):
+        """Rebuilds the disk index from a previous run, least recently used first."""
+        entries = sorted(self.directory.glob("*/*.audio"), key=lambda p: p.stat().st_mtime)
+        for path in entries:
+            size = path.stat().st_size
+            self._disk[path.stem] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_memory(self):
+        while self._memory_bytes > self.memory_budget and self._memory:
+            _, audio = self._memory.popitem(last=False)
+            self._memory_bytes -= len(audio)
+            self._counters["memory_evictions"] += 1
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_budget and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._counters["disk_evictions"] += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.memory_budget:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        self._evict_memory()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return audio
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                # One read straight into the bytes object that is returned and kept in memory
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable TTS cache entry {key[:12]}: {e}")
+                with self._lock:
+                    self._disk_bytes -= self._disk.pop(key, 0)
+                audio = None
+
+        with self._lock:
+            if audio is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, audio)
+            return audio
+
+    def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix(f".tmp{threading.get_ident()}")
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._counters["stores"] += 1
+            self._disk_bytes += len(audio) - self._disk.pop(key, 0)
+            self._disk[key] = len(audio)
+            self._evict_disk()
+            self._remember(key, audio)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_budget": self.memory_budget,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_budget": self.disk_budget,
+            }
+
+
+# Sentences the agent says verbatim, worth synthesizing ahead of time; one sentence per
+# entry, since turns look up the cache sentence by sentence
+KNOWN_PHRASES = [
+    "Sorry, I couldn't fetch the weather information at the moment.",
+    "Weather API key is not configured.",
+    "Please add it in the settings.",
+    "I'm sorry, I encountered an error while processing your request.",
+    "I'm sorry, I encountered an error while searching the web.",
+    "I couldn't find any relevant information on the web for that.",
+]
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    """Warm-up command: python -m services.tts_cache warm [--phrases-file FILE]"""
+    import config
+    from services import downlink, tts
+
+    parser = argparse.ArgumentParser(prog="python -m services.tts_cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="synthesize known phrases into the cache, in every negotiable format")
+    warm.add_argument("--phrases-file", type=Path, help="extra phrases, one per line")
+    sub.add_parser("stats", help="print cache counters")
+    args = parser.parse_args(argv)
+
+    if tts.audio_cache is None:
+        raise SystemExit("The TTS cache is disabled; set TTS_CACHE_ENABLED=true to use it.")
+
+    if args.command == "warm":
+        phrases = list(KNOWN_PHRASES)
+        if args.phrases_file:
+            phrases += [line.strip() for line in args.phrases_file.read_text().splitlines() if line.strip()]
+        # The Murf formats and sample rates sessions request with the server's downlink settings
+        outputs = downlink.murf_outputs(config.DOWNLINK_CODECS, config.DOWNLINK_SAMPLE_RATE)
+        warmed, attempted = tts.warm_cache(phrases, outputs=outputs)
+        print(f"Warmed {warmed} of {attempted} cache entries ({len(outputs)} formats: {outputs})")
+    print(tts.audio_cache.stats())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,191 @@
+# services/uplink.py
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import shutil
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import opuslib
+except ImportError:  # Raw Opus packets are only offered when opuslib (and libopus) is installed
+    opuslib = None
+
+logger = logging.getLogger(__name__)
+
+# Microphone formats a client can announce in its config message, e.g. {"uplink": ["webm-opus", "pcm16"]}
+PCM16 = "pcm16"            # raw 16 kHz mono Int16 PCM, what the browser sent before
+WEBM_OPUS = "webm-opus"    # MediaRecorder output, decoded by an ffmpeg subprocess
+OPUS = "opus"              # one raw Opus packet per WebSocket message, decoded with opuslib
+
+PIPE_READ_BYTES = 4096
+# Longest Opus packet is 120 ms
+OPUS_MAX_FRAME_MS = 120
+
+
+def available_codecs(enabled: List[str]) -> List[str]:
+    """The enabled uplink formats this server can actually decode."""
+    usable = {PCM16: True, WEBM_OPUS: shutil.which("ffmpeg") is not None, OPUS: opuslib is not None}
+    return [codec for codec in enabled if usable.get(codec)]
+
+
+def negotiate(offered: Any, enabled: List[str]) -> str:
+    """Picks the client's most preferred format the server supports, falling back to PCM."""
+    if isinstance(offered, str):
+        offered = [offered]
+    available = available_codecs(enabled)
+    for codec in offered or []:
+        if codec in available:
+            return codec
+    return PCM16
+
+
+class UplinkDecoder(ABC):
+    """Turns compressed microphone audio into 16-bit mono PCM and hands it to `on_pcm`."""
+
+    codec = PCM16
+
+    def __init__(self, on_pcm: Callable[[bytes], Awaitable[None]], sample_rate: int = 16000):
+        self.on_pcm = on_pcm
+        self.sample_rate = sample_rate
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.decode_errors = 0
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def feed(self, data: bytes):
+        """Decodes one message of microphone audio."""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        seconds = self.bytes_out / (self.sample_rate * 2)
+        return {
+            "codec": self.codec,
+            "bytes_in": self.bytes_in,
+            "pcm_bytes_out": self.bytes_out,
+            "compression_ratio": round(self.bytes_out / self.bytes_in, 1) if self.bytes_in else None,
+            "uplink_kbps": round(self.bytes_in * 8 / seconds / 1000, 1) if seconds else None,
+            "decode_errors": self.decode_errors,
+        }
+
+
+class FfmpegStreamDecoder(UplinkDecoder):
+    """
+    Decodes a WebM/Opus byte stream with one long-lived ffmpeg process per session.
+
+    Container chunks go to ffmpeg's stdin as they arrive, and a reader task
+    forwards decoded PCM from its stdout. Probing and output buffering are
+    turned off, so audio comes out within a frame or two of going in. If
+    ffmpeg exits or `on_pcm` fails, the decoder stops and `failed` is set;
+    later input is dropped.
+    """
+
+    codec = WEBM_OPUS
+
+    def __init__(self, on_pcm: Callable[[bytes], Awaitable[None]], sample_rate: int = 16000, input_format: str = "matroska"):
+        super().__init__(on_pcm, sample_rate)
+        self.input_format = input_format
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._remainder = b""
+        self.failed = False
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-fflags", "nobuffer", "-flags", "low_delay", "-probesize", "32", "-analyzeduration", "0",
+            "-f", self.input_format, "-i", "pipe:0",
+            "-ac", "1", "-ar", str(self.sample_rate), "-f", "s16le", "-flush_packets", "1",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._reader = asyncio.create_task(self._read())
+
+    async def feed(self, data: bytes):
+        if self.failed or self.process is None or self.process.stdin.is_closing():
+            return
+        self.bytes_in += len(data)
+        try:
+            self.process.stdin.write(data)
+            # Waits only when ffmpeg falls behind, which pushes back on the client
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # Logged once; everything after this is dropped
+            self._fail(f"ffmpeg uplink decoder exited (code {self.process.returncode})")
+
+    def _fail(self, reason: str):
+        if not self.failed:
+            self.failed = True
+            self.decode_errors += 1
+            logger.error(reason)
+
+    async def _read(self):
+        try:
+            while chunk := await self.process.stdout.read(PIPE_READ_BYTES):
+                data = self._remainder + chunk
+                usable = len(data) - len(data) % 2
+                self._remainder = data[usable:]
+                if usable:
+                    self.bytes_out += usable
+                    await self.on_pcm(data[:usable])
+        except Exception as e:
+            # A failing consumer would otherwise die silently and leave ffmpeg blocked on a full pipe
+            self._fail(f"Uplink PCM handler failed, stopping the decoder: {e}")
+            if self.process.returncode is None:
+                self.process.kill()
+
+    async def close(self, drain_timeout: float = 1.0):
+        """Decodes what ffmpeg still holds (for up to `drain_timeout` seconds), then stops it."""
+        if self.process is None:
+            return
+        if not self.process.stdin.is_closing():
+            self.process.stdin.close()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._reader), drain_timeout)
+        except asyncio.TimeoutError:
+            self._reader.cancel()
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+
+
+class OpusPacketDecoder(UplinkDecoder):
+    """Decodes one raw Opus packet per message in-process with libopus."""
+
+    codec = OPUS
+
+    def __init__(self, on_pcm: Callable[[bytes], Awaitable[None]], sample_rate: int = 16000):
+        super().__init__(on_pcm, sample_rate)
+        self._decoder = opuslib.Decoder(sample_rate, 1)
+        self._max_frame = sample_rate * OPUS_MAX_FRAME_MS // 1000
+        self.decode_seconds = 0.0
+
+    async def feed(self, data: bytes):
+        self.bytes_in += len(data)
+        start = time.process_time()
+        try:
+            pcm = self._decoder.decode(data, self._max_frame)
+        except opuslib.OpusError as e:
+            self.decode_errors += 1
+            logger.warning(f"Dropping undecodable Opus packet: {e}")
+            return
+        finally:
+            self.decode_seconds += time.process_time() - start
+        self.bytes_out += len(pcm)
+        await self.on_pcm(pcm)
+
+
+def create_decoder(codec: str, on_pcm: Callable[[bytes], Awaitable[None]], sample_rate: int = 16000) -> Optional[UplinkDecoder]:
+    """The decoder for a negotiated uplink format, or None when audio already arrives as PCM."""
+    if codec == WEBM_OPUS:
+        return FfmpegStreamDecoder(on_pcm, sample_rate)
+    if codec == OPUS:
+        return OpusPacketDecoder(on_pcm, sample_rate)
+    return None
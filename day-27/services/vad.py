@@ -0,0 +1,143 @@
+# services/vad.py
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A speech model takes int16 frames shaped (n_frames, frame_samples) and returns one bool per frame
+SpeechModel = Callable[[np.ndarray], np.ndarray]
+
+
+class EnergyZcrModel:
+    """
+    Classifies frames by RMS energy against an adaptive noise floor, rejecting
+    frames whose zero-crossing rate is too high to be voiced speech (hiss, clicks).
+    """
+
+    def __init__(self, min_rms: float = 300.0, energy_ratio: float = 3.0, max_zcr: float = 0.35):
+        self.min_rms = min_rms
+        self.energy_ratio = energy_ratio
+        self.max_zcr = max_zcr
+        self.noise_floor = min_rms / energy_ratio
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        samples = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        threshold = max(self.min_rms, self.noise_floor * self.energy_ratio)
+        speech = (rms > threshold) & (zcr < self.max_zcr)
+        quiet = rms[~speech]
+        if quiet.size:
+            # Track the background level slowly so a loud room raises the bar
+            self.noise_floor = 0.9 * self.noise_floor + 0.1 * float(np.mean(quiet))
+        return speech
+
+
+class VoiceActivityGate:
+    """
+    Gates 16 kHz mono int16 PCM before it is streamed to the STT provider.
+
+    Audio is split into `frame_ms` frames and classified by `model`. Speech
+    starts after `speech_start_ms` of consecutive speech frames; the
+    `preroll_ms` before it is sent too, so word onsets are not clipped. After
+    speech, `hangover_ms` of trailing silence is forwarded so the provider can
+    still detect the end of the turn, then `process` reports the end of
+    speech and silence is dropped, apart from `keepalive_chunk_ms` of digital
+    silence every `keepalive_ms` to keep the streaming session open (v3
+    rejects chunks shorter than 50 ms, so a lone frame is not enough).
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        preroll_ms: int = 300,
+        hangover_ms: int = 700,
+        speech_start_ms: int = 60,
+        keepalive_ms: int = 5000,
+        keepalive_chunk_ms: int = 50,
+        model: Optional[SpeechModel] = None,
+    ):
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self.model = model or EnergyZcrModel()
+        self.start_frames = max(1, speech_start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.keepalive_frames = max(1, keepalive_ms // frame_ms) if keepalive_ms else 0
+        # Whole frames, rounded up so the keepalive never falls under keepalive_chunk_ms
+        self._keepalive = bytes(-(-keepalive_chunk_ms // frame_ms) * self.frame_bytes)
+        self._preroll: Deque[bytes] = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._remainder = b""
+        self._active = False
+        self._speech_run = 0
+        self._silence_run = 0
+        self._since_forward = 0
+        self.forwarded_bytes = 0
+        self.dropped_bytes = 0
+        self.speech_segments = 0
+
+    def process(self, pcm: bytes) -> Tuple[List[bytes], bool]:
+        """
+        Returns the audio to forward for this chunk (possibly none), and
+        whether a speech segment ended in it. The caller should close the
+        turn only after forwarding that audio, which carries the hangover.
+        """
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return [], False
+
+        frames = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, self.frame_samples)
+        speech = self.model(frames)
+
+        out: List[bytes] = []
+        ended = False
+        for index, is_speech in enumerate(speech):
+            frame = data[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+            if self._active:
+                out.append(frame)
+                self._since_forward = 0
+                self._silence_run = 0 if is_speech else self._silence_run + 1
+                if self._silence_run >= self.hangover_frames:
+                    self._active = False
+                    self._speech_run = 0
+                    self._silence_run = 0
+                    ended = True
+                continue
+
+            self._speech_run = self._speech_run + 1 if is_speech else 0
+            if self._speech_run >= self.start_frames:
+                # Speech confirmed: send the buffered lead-in, then stream live
+                self._active = True
+                self.speech_segments += 1
+                self._silence_run = 0
+                out.extend(self._preroll)
+                self._preroll.clear()
+                out.append(frame)
+                continue
+
+            if len(self._preroll) == self._preroll.maxlen:
+                self.dropped_bytes += self.frame_bytes
+            self._preroll.append(frame)
+            self._since_forward += 1
+            if self.keepalive_frames and self._since_forward >= self.keepalive_frames:
+                out.append(self._keepalive)
+                self._since_forward = 0
+
+        self.forwarded_bytes += sum(len(chunk) for chunk in out)
+        return out, ended
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.forwarded_bytes + self.dropped_bytes
+        return {
+            "forwarded_bytes": self.forwarded_bytes,
+            "dropped_bytes": self.dropped_bytes,
+            "dropped_ratio": round(self.dropped_bytes / total, 3) if total else 0.0,
+            "speech_segments": self.speech_segments,
+            "speaking": self._active,
+        }
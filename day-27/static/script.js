@@ -15,14 +15,61 @@ document.addEventListener("DOMContentLoaded", () => {
   const weatherapiKeyInput = document.getElementById("weatherapi-key");
   const personaSelect = document.getElementById("persona-select");
 
+  // Binary audio frames: 12-byte header (version, codec, flags, reserved,
+  // turn id u32, sentence u16, seq u16) followed by the audio payload
+  const AUDIO_PROTOCOL_VERSION = 1;
+  const FRAME_HEADER_BYTES = 12;
+  const FLAG_FINAL = 0x01;
+  const CODEC_WAV = 1;
+  const CODEC_PCM16 = 2;
+  const CODEC_MP3 = 3;
+  const CODEC_OPUS = 4;
+
+  // Assistant audio: compressed codecs this browser can play, best first. The server answers
+  // with {"type": "downlink", "codec", "sample_rate", "mime"}; each frame header names its codec
+  const DOWNLINK_SAMPLE_RATE = 24000;
+  const OPUS_MIME = 'audio/webm; codecs="opus"';
+  const MP3_MIME = "audio/mpeg";
+  const downlinkCodecs = () => {
+    const codecs = [];
+    if (window.MediaSource && MediaSource.isTypeSupported(OPUS_MIME)) codecs.push("opus");
+    if (window.MediaSource && MediaSource.isTypeSupported(MP3_MIME)) codecs.push("mp3");
+    return codecs.concat(["pcm16", "wav"]);
+  };
+
+  // Barge-in: mic energy above this level for a few buffers while audio plays interrupts the reply
+  const BARGE_IN_RMS = 0.04;
+  const BARGE_IN_BUFFERS = 2;
+
+  // Compressed microphone uplink: Opus in WebM from MediaRecorder, ~10x smaller than raw PCM.
+  // The server answers the config with {"type": "uplink", "codec"} and audio is only sent after that
+  const UPLINK_MIME = "audio/webm;codecs=opus";
+  const UPLINK_BITRATE = 24000;
+  const UPLINK_TIMESLICE_MS = 100;
+  const canSendOpus = () => window.MediaRecorder && MediaRecorder.isTypeSupported(UPLINK_MIME);
+
   let config = {};
   let isRecording = false;
   let ws = null;
   let audioContext;
   let mediaStream;
   let processor;
-  let audioQueue = [];
-  let isPlaying = false;
+  let playbackContext;
+  let nextPlayTime = 0;
+  let wavStream = null;
+  let activeSources = new Set();
+  let interruptedTurn = 0;
+  let playingTurn = 0;
+  // Sentences of the playing turn that finished playing, reported to the server so an
+  // interrupted turn is remembered only up to what was actually heard
+  let heard = { turn: 0, sentences: 0 };
+  let playedTimers = [];
+  let loudBuffers = 0;
+  let uplinkCodec = null;
+  let recorder = null;
+  let downlink = { codec: "wav", sampleRate: 44100, mime: null };
+  let mse = null;
+  let pcmRemainder = new Uint8Array(0);
 
   // --- Modal & Settings Logic ---
   settingsBtn.addEventListener("click", () => {
@@ -41,6 +88,10 @@ document.addEventListener("DOMContentLoaded", () => {
     
     config = {
         type: "config",
+        protocol: AUDIO_PROTOCOL_VERSION,
+        uplink: canSendOpus() ? ["webm-opus", "pcm16"] : ["pcm16"],
+        downlink: { codecs: downlinkCodecs(), sample_rate: DOWNLINK_SAMPLE_RATE },
+        playback_reports: true,
         keys: {
             murf: murfKey,
             assemblyai: assemblyaiKey,
@@ -67,35 +118,229 @@ document.addEventListener("DOMContentLoaded", () => {
     chatLog.scrollTop = chatLog.scrollHeight;
   };
 
-  const playNextInQueue = () => {
-    if (audioQueue.length > 0 && !isPlaying) {
-      isPlaying = true;
-      const base64Audio = audioQueue.shift();
-      const audioData = Uint8Array.from(atob(base64Audio), (c) => c.charCodeAt(0)).buffer;
-      
-      if (!audioContext || audioContext.state === 'closed') {
-          audioContext = new (window.AudioContext || window.webkitAudioContext)();
+  const handleAudioFrame = (buffer) => {
+    const view = new DataView(buffer);
+    if (buffer.byteLength < FRAME_HEADER_BYTES || view.getUint8(0) !== AUDIO_PROTOCOL_VERSION) {
+      console.error("Unsupported audio frame");
+      return;
+    }
+    const codec = view.getUint8(1);
+    const flags = view.getUint8(2);
+    const turn = view.getUint32(4);
+    const sentence = view.getUint16(8);
+    if (turn <= interruptedTurn) return;
+    playingTurn = turn;
+    const payload = new Uint8Array(buffer, FRAME_HEADER_BYTES);
+    if (payload.length > 0) {
+      if (codec === CODEC_MP3 || codec === CODEC_OPUS) {
+        pushCompressedChunk(payload);
+      } else if (codec === CODEC_PCM16) {
+        pushPcmChunk(payload);
+      } else {
+        pushAudioChunk(`${turn}:${sentence}`, payload);
+      }
+    }
+    if (flags & FLAG_FINAL) {
+      wavStream = null;
+      pcmRemainder = new Uint8Array(0);
+      if (codec === CODEC_MP3 || codec === CODEC_OPUS) {
+        if (mse) {
+          mse.queue.push({ turn, sentences: sentence + 1 });
+          flushMediaQueue(mse);
+        }
+      } else {
+        // Everything of this sentence is scheduled; it has been heard once nextPlayTime passes
+        const delay = Math.max(0, (nextPlayTime - getPlaybackContext().currentTime) * 1000);
+        playedTimers.push(setTimeout(() => reportPlayed(turn, sentence + 1), delay));
       }
+    }
+  };
 
-      audioContext.decodeAudioData(audioData)
-        .then((buffer) => {
-          const source = audioContext.createBufferSource();
-          source.buffer = buffer;
-          source.connect(audioContext.destination);
-          source.onended = () => {
-            isPlaying = false;
-            playNextInQueue();
-          };
-          source.start();
-        })
-        .catch((e) => {
-          console.error("Error decoding audio data:", e);
-          isPlaying = false;
-          playNextInQueue();
-        });
+  const reportPlayed = (turn, sentences) => {
+    if (turn <= interruptedTurn) return;
+    heard = { turn, sentences };
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type: "played", turn, sentences }));
     }
   };
 
+  // --- Streaming Playback ---
+  // Each sentence arrives as a WAV stream split into chunks: the first chunk carries
+  // the header, the rest is raw PCM. Chunks are scheduled back-to-back as they land.
+  const getPlaybackContext = () => {
+    if (!playbackContext || playbackContext.state === 'closed') {
+      playbackContext = new (window.AudioContext || window.webkitAudioContext)();
+    }
+    return playbackContext;
+  };
+
+  const parseWavHeader = (bytes) => {
+    if (bytes.length < 12) return null;
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 12;
+    let sampleRate = 44100;
+    let channels = 1;
+    while (offset + 8 <= bytes.length) {
+      const id = String.fromCharCode(...bytes.subarray(offset, offset + 4));
+      const size = view.getUint32(offset + 4, true);
+      if (id === 'data') {
+        return { sampleRate, channels, dataOffset: offset + 8 };
+      }
+      if (id === 'fmt ') {
+        if (offset + 16 > bytes.length) return null;
+        channels = view.getUint16(offset + 10, true);
+        sampleRate = view.getUint32(offset + 12, true);
+      }
+      offset += 8 + size + (size % 2);
+    }
+    return null;
+  };
+
+  const schedulePcm = (bytes, { sampleRate, channels }) => {
+    const ctx = getPlaybackContext();
+    const samples = new Int16Array(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length));
+    const frames = samples.length / channels;
+    const buffer = ctx.createBuffer(channels, frames, sampleRate);
+    for (let ch = 0; ch < channels; ch++) {
+      const out = buffer.getChannelData(ch);
+      for (let i = 0; i < frames; i++) {
+        out[i] = samples[i * channels + ch] / 32768;
+      }
+    }
+    const source = ctx.createBufferSource();
+    source.buffer = buffer;
+    source.connect(ctx.destination);
+    const startAt = Math.max(ctx.currentTime + 0.05, nextPlayTime);
+    source.start(startAt);
+    nextPlayTime = startAt + buffer.duration;
+    activeSources.add(source);
+    source.onended = () => activeSources.delete(source);
+  };
+
+  // Headerless 16-bit mono PCM at the negotiated rate; an odd trailing byte waits for the next chunk
+  const pushPcmChunk = (bytes) => {
+    const data = new Uint8Array(pcmRemainder.length + bytes.length);
+    data.set(pcmRemainder);
+    data.set(bytes, pcmRemainder.length);
+    const usable = data.length - (data.length % 2);
+    pcmRemainder = data.slice(usable);
+    if (usable > 0) {
+      schedulePcm(data.subarray(0, usable), { sampleRate: downlink.sampleRate, channels: 1 });
+    }
+  };
+
+  // --- Compressed playback (MP3 / Opus in WebM) through Media Source Extensions ---
+  // Every sentence is a self-contained stream; "sequence" mode plays them back-to-back
+  const openMediaSource = () => {
+    const audio = new Audio();
+    const mediaSource = new MediaSource();
+    const state = { audio, mediaSource, sourceBuffer: null, queue: [], marks: [] };
+    audio.src = URL.createObjectURL(mediaSource);
+    audio.addEventListener("timeupdate", () => {
+      while (state.marks.length > 0 && audio.currentTime >= state.marks[0].end) {
+        const mark = state.marks.shift();
+        reportPlayed(mark.turn, mark.sentences);
+      }
+    });
+    mediaSource.addEventListener("sourceopen", () => {
+      state.sourceBuffer = mediaSource.addSourceBuffer(downlink.mime);
+      state.sourceBuffer.mode = "sequence";
+      state.sourceBuffer.addEventListener("updateend", () => flushMediaQueue(state));
+      flushMediaQueue(state);
+    });
+    audio.play().catch((e) => console.error("Playback failed:", e));
+    return state;
+  };
+
+  // The queue holds audio chunks and sentence-end marks; a mark is reached once everything before it is appended
+  const flushMediaQueue = (state) => {
+    while (state.sourceBuffer && !state.sourceBuffer.updating && state.queue.length > 0) {
+      const item = state.queue.shift();
+      if (item instanceof Uint8Array) {
+        state.sourceBuffer.appendBuffer(item);
+        return;
+      }
+      const buffered = state.sourceBuffer.buffered;
+      state.marks.push({ ...item, end: buffered.length > 0 ? buffered.end(buffered.length - 1) : 0 });
+    }
+  };
+
+  const pushCompressedChunk = (bytes) => {
+    if (!mse) mse = openMediaSource();
+    mse.queue.push(bytes.slice());
+    flushMediaQueue(mse);
+  };
+
+  const mediaIsPlaying = () => {
+    if (!mse || mse.audio.paused) return false;
+    const buffered = mse.audio.buffered;
+    return buffered.length > 0 && mse.audio.currentTime < buffered.end(buffered.length - 1);
+  };
+
+  const stopMediaSource = () => {
+    if (!mse) return;
+    mse.audio.pause();
+    URL.revokeObjectURL(mse.audio.src);
+    mse = null;
+  };
+
+  // Silences everything already scheduled, e.g. when the user talks over the assistant
+  const stopPlayback = () => {
+    activeSources.forEach((source) => {
+      try {
+        source.stop();
+      } catch (e) {
+        // Already stopped
+      }
+    });
+    activeSources.clear();
+    playedTimers.forEach((timer) => clearTimeout(timer));
+    playedTimers = [];
+    nextPlayTime = 0;
+    wavStream = null;
+    pcmRemainder = new Uint8Array(0);
+    stopMediaSource();
+  };
+
+  const isPlaying = () => activeSources.size > 0 || mediaIsPlaying();
+
+  const pushAudioChunk = (key, bytes) => {
+    if (!wavStream || wavStream.key !== key) {
+      wavStream = { key, header: null, pending: new Uint8Array(0) };
+    }
+    let data = new Uint8Array(wavStream.pending.length + bytes.length);
+    data.set(wavStream.pending);
+    data.set(bytes, wavStream.pending.length);
+
+    if (!wavStream.header) {
+      const header = parseWavHeader(data);
+      if (!header) {
+        wavStream.pending = data;
+        return;
+      }
+      wavStream.header = header;
+      data = data.subarray(header.dataOffset);
+    }
+
+    const frameBytes = 2 * wavStream.header.channels;
+    const usable = data.length - (data.length % frameBytes);
+    wavStream.pending = data.slice(usable);
+    if (usable > 0) {
+      schedulePcm(data.subarray(0, usable), wavStream.header);
+    }
+  };
+
+  // Streams the microphone as WebM/Opus; each timeslice continues the same WebM stream
+  const startOpusUplink = () => {
+    recorder = new MediaRecorder(mediaStream, { mimeType: UPLINK_MIME, audioBitsPerSecond: UPLINK_BITRATE });
+    recorder.ondataavailable = (event) => {
+      if (event.data.size > 0 && ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(event.data);
+      }
+    };
+    recorder.start(UPLINK_TIMESLICE_MS);
+  };
+
   const startRecording = async () => {
     try {
       // This is where the browser asks for permission
@@ -114,30 +359,62 @@ document.addEventListener("DOMContentLoaded", () => {
       processor.onaudioprocess = (e) => {
         const inputData = e.inputBuffer.getChannelData(0);
         const pcmData = new Int16Array(inputData.length);
+        let energy = 0;
         for (let i = 0; i < inputData.length; i++) {
           pcmData[i] = Math.max(-1, Math.min(1, inputData[i])) * 32767;
+          energy += inputData[i] * inputData[i];
         }
-        if (ws && ws.readyState === WebSocket.OPEN) {
+
+        // The user is talking over the assistant: stop playback and cancel the turn server-side
+        loudBuffers = Math.sqrt(energy / inputData.length) > BARGE_IN_RMS ? loudBuffers + 1 : 0;
+        if (isPlaying() && loudBuffers >= BARGE_IN_BUFFERS && ws && ws.readyState === WebSocket.OPEN) {
+          // Frames of this turn still in flight are dropped on arrival
+          interruptedTurn = playingTurn;
+          stopPlayback();
+          // Tells the server how much of the reply was heard, so only that goes into the history
+          const sentences = heard.turn === playingTurn ? heard.sentences : 0;
+          ws.send(JSON.stringify({ type: "interrupt", turn: playingTurn, sentences }));
+          loudBuffers = 0;
+        }
+        if (uplinkCodec === "pcm16" && ws && ws.readyState === WebSocket.OPEN) {
           ws.send(pcmData.buffer);
         }
       };
 
       const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
       ws = new WebSocket(`${wsProtocol}//${window.location.host}/ws`);
+      ws.binaryType = "arraybuffer";
 
       ws.onopen = () => {
         ws.send(JSON.stringify(config));
       };
 
       ws.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+          handleAudioFrame(event.data);
+          return;
+        }
         const msg = JSON.parse(event.data);
-        if (msg.type === "assistant") {
+        if (msg.type === "downlink") {
+          downlink = { codec: msg.codec, sampleRate: msg.sample_rate, mime: msg.mime };
+        } else if (msg.type === "uplink") {
+          uplinkCodec = msg.codec;
+          if (uplinkCodec === "webm-opus") startOpusUplink();
+        } else if (msg.type === "assistant") {
           addMessage(msg.text, "assistant");
         } else if (msg.type === "final") {
           addMessage(msg.text, "user");
-        } else if (msg.type === "audio") {
-          audioQueue.push(msg.b64);
-          playNextInQueue();
+        } else if (msg.type === "interrupted") {
+          interruptedTurn = Math.max(interruptedTurn, msg.turn);
+          stopPlayback();
+          statusDisplay.textContent = "Listening...";
+        } else if (msg.type === "audio_chunk") {
+          if (msg.turn <= interruptedTurn) return;
+          playingTurn = msg.turn;
+          const bytes = Uint8Array.from(atob(msg.b64), (c) => c.charCodeAt(0));
+          pushAudioChunk(`${msg.turn}:${msg.sentence}`, bytes);
+        } else if (msg.type === "audio_end") {
+          wavStream = null;
         }
       };
 
@@ -151,6 +428,10 @@ document.addEventListener("DOMContentLoaded", () => {
   };
 
   const stopRecording = () => {
+    stopPlayback();
+    if (recorder && recorder.state !== "inactive") recorder.stop();
+    recorder = null;
+    uplinkCodec = null;
     if (processor) processor.disconnect();
     if (mediaStream) mediaStream.getTracks().forEach((track) => track.stop());
     if (ws) ws.close();
@@ -0,0 +1,75 @@
+# tests/test_llm_keys.py
+import asyncio
+import unittest
+from unittest import mock
+
+from google.ai import generativelanguage as glm
+
+from services import llm
+
+
+class FakeStream:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def __aiter__(self):
+        for word in ("reply", "for", self.api_key):
+            # Let the other session's stream run in between
+            await asyncio.sleep(0)
+            yield glm.GenerateContentResponse(
+                candidates=[glm.Candidate(content=glm.Content(role="model", parts=[glm.Part(text=word + " ")]))]
+            )
+
+    def cancel(self):
+        return False
+
+
+class FakeAsyncClient:
+    def __init__(self, client_options):
+        self.api_key = client_options.api_key
+        self.requests = []
+
+    async def stream_generate_content(self, request, timeout):
+        self.requests.append(request)
+        return FakeStream(self.api_key)
+
+
+class ModelKeyTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.registry = llm.ModelRegistry()
+        patches = [
+            mock.patch.object(llm.glm, "GenerativeServiceAsyncClient", FakeAsyncClient),
+            mock.patch.object(llm, "model_registry", self.registry),
+            mock.patch.object(llm.persona_registry, "warm"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def reply(self, api_key: str) -> str:
+        stream = llm.LLMStream("hello", [], api_key)
+        async for _ in stream:
+            pass
+        self.assertTrue(stream.completed)
+        return stream.text.strip()
+
+    async def test_model_keeps_its_key_when_another_key_is_used_first(self):
+        model_a = self.registry.get("KEY_A")
+        model_b = self.registry.get("KEY_B")
+        # B's client exists before A's model makes its first request
+        self.assertEqual(model_b.async_client.api_key, "KEY_B")
+        self.assertEqual(model_a.async_client.api_key, "KEY_A")
+
+    async def test_interleaved_sessions_use_their_own_keys(self):
+        keys = ["KEY_A", "KEY_B", "KEY_A", "KEY_B"]
+        replies = await asyncio.gather(*(self.reply(key) for key in keys))
+        self.assertEqual(replies, [f"reply for {key}" for key in keys])
+        for key in ("KEY_A", "KEY_B"):
+            client = self.registry.get(key).async_client
+            self.assertEqual(client.api_key, key)
+            self.assertEqual(len(client.requests), 2)
+        self.assertEqual(self.registry.stats()["misses"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()